@@ -2,43 +2,131 @@
 # Imports
 #----------------------------------------------------------------------------#
 
+import os
 import json
-import dateutil.parser
-import babel
-from flask import Flask, render_template, request, Response, flash, redirect, url_for
+import base64
+import hashlib
+import time
+from datetime import datetime, timedelta
+from bisect import bisect_left
+from functools import wraps, lru_cache
+import heapq
+from itertools import groupby
+from flask import Flask, Blueprint, render_template, request, Response, flash, redirect, url_for, abort, session, make_response, stream_with_context, g, get_flashed_messages, current_app
 from flask_moment import Moment
-from flask_sqlalchemy import SQLAlchemy
 import logging
 from logging import Formatter, FileHandler
-from flask_wtf import Form
-from forms import *
-from flask_migrate import Migrate
-from sqlalchemy.dialects.postgresql import ARRAY
-import ast
+from cache import PageCache
+from jobs import JobQueue
+from replicas import RoutingSQLAlchemy, ReplicaRouting, replica_reads
+from instrumentation import SQLInstrumentation
+import bulk
+import assets
+import geo
+import suggest
+from compression import Compress
+from jinja2 import FileSystemBytecodeCache
+from werkzeug.exceptions import HTTPException
+from sqlalchemy.dialects.sqlite.aiosqlite import AsyncAdapt_aiosqlite_connection
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import IntegrityError
+import sqlite3
+import click
+from flask.cli import AppGroup
 import sys
 #----------------------------------------------------------------------------#
 # App Config.
 #----------------------------------------------------------------------------#
 
-app = Flask(__name__)
-moment = Moment(app)
-app.config.from_object('config')
-db = SQLAlchemy(app)
-migrate = Migrate(app, db
+# Extensions are bound to an app by create_app() at the bottom of this file.
+moment = Moment()
+db = RoutingSQLAlchemy()
+replica_routing = ReplicaRouting()
+compress = Compress()
+page_cache = PageCache()
+jobs = JobQueue()
+sql_instrumentation = SQLInstrumentation()
+static_assets = assets.Assets()
+
+def unicode_lower(value):
+    return value.lower() if isinstance(value, str) else value
+
+@db.event.listens_for(Engine, 'connect')
+def configure_sqlite(dbapi_connection, connection_record):
+    # Plain and aiosqlite (asgi.py) connections alike.
+    if isinstance(dbapi_connection, (sqlite3.Connection, AsyncAdapt_aiosqlite_connection)):
+        # SQLite ignores ON DELETE CASCADE unless foreign keys are switched on.
+        dbapi_connection.execute('PRAGMA foreign_keys = ON')
+        # Its built-in lower() only folds ASCII letters, so name searches
+        # would miss "É" for "é"; Python's folds them as PostgreSQL does.
+        dbapi_connection.create_function('lower', 1, unicode_lower)
 
 #----------------------------------------------------------------------------#
 # Models.
 #----------------------------------------------------------------------------#
 
-shows = db.Table('shows',
-    db.Column('id', db.Integer, primary_key=True),
-    db.Column('start_time', db.DateTime, nullable=False),
-    db.Column('venue_id', db.Integer, db.ForeignKey('venues.id')),
-    db.Column('artist_id', db.Integer, db.ForeignKey('artists.id'))
+venue_genres = db.Table('venue_genres',
+    db.Column('venue_id', db.Integer, db.ForeignKey('venues.id', ondelete='CASCADE'), primary_key=True),
+    db.Column('genre_id', db.Integer, db.ForeignKey('genres.id'), primary_key=True),
+    db.Index('ix_venue_genres_genre_id', 'genre_id', 'venue_id')
+)
+
+artist_genres = db.Table('artist_genres',
+    db.Column('artist_id', db.Integer, db.ForeignKey('artists.id', ondelete='CASCADE'), primary_key=True),
+    db.Column('genre_id', db.Integer, db.ForeignKey('genres.id'), primary_key=True),
+    db.Index('ix_artist_genres_genre_id', 'genre_id', 'artist_id')
 )
 
+class Genre(db.Model):
+        __tablename__ = 'genres'
+        id = db.Column(db.Integer, primary_key=True)
+        name = db.Column(db.String(120), nullable=False, unique=True)
+
+        def __repr__(self):
+            return f'<Genre {self.id} {self.name}>'
+
+# Shows occupy [start_time, end_time). Capping their length lets overlap
+# queries bound start_time from below as well as above, which keeps them
+# range scans on the (venue_id/artist_id, start_time) indexes.
+DEFAULT_SHOW_DURATION = timedelta(minutes=120)
+MAX_SHOW_DURATION = timedelta(hours=24)
+
+class Show(db.Model):
+        __tablename__ = 'shows'
+        __table_args__ = (
+            db.Index('ix_shows_venue_id_start_time', 'venue_id', 'start_time'),
+            db.Index('ix_shows_artist_id_start_time', 'artist_id', 'start_time'),
+            db.Index('ix_shows_start_time_id', 'start_time', 'id'),
+            db.CheckConstraint('end_time > start_time', name='shows_time_range_check'),
+        )
+        id = db.Column(db.Integer, primary_key=True)
+        start_time = db.Column(db.DateTime, nullable=False)
+        end_time = db.Column(db.DateTime, nullable=False)
+        venue_id = db.Column(db.Integer, db.ForeignKey('venues.id', ondelete='CASCADE'))
+        artist_id = db.Column(db.Integer, db.ForeignKey('artists.id', ondelete='CASCADE'))
+
+        def __repr__(self):
+            return f'<Show {self.id} {self.venue_id} {self.artist_id} {self.start_time}>'
+
+# On PostgreSQL the database itself refuses double bookings: GiST exclusion
+# constraints over (venue or artist, time range), with btree_gist for the
+# integer equality.
+db.event.listen(Show.__table__, 'after_create',
+    db.DDL('CREATE EXTENSION IF NOT EXISTS btree_gist').execute_if(dialect='postgresql'))
+for _column in ('venue_id', 'artist_id'):
+    db.event.listen(Show.__table__, 'after_create', db.DDL(
+        'ALTER TABLE shows ADD CONSTRAINT shows_{0}_excl '
+        'EXCLUDE USING gist ({0} WITH =, tsrange(start_time, end_time) WITH &&)'.format(_column)
+    ).execute_if(dialect='postgresql'))
+
 class Venue(db.Model):
         __tablename__ = 'venues'
+        __table_args__ = (
+            db.Index('ix_venues_name_trgm', 'name', postgresql_using='gin',
+                postgresql_ops={'name': 'gin_trgm_ops'}),
+            db.Index('ix_venues_next_show_time', 'next_show_time'),
+            db.Index('ix_venues_geohash', 'geohash'),
+        )
         id = db.Column(db.Integer, primary_key=True)
         name = db.Column(db.String)
         city = db.Column(db.String(120))
@@ -48,169 +136,819 @@ class Venue(db.Model):
         image_link = db.Column(db.String(500))
         facebook_link = db.Column(db.String(120))
         website = db.Column(db.String(120))
-        genres = db.Column(db.String(500))
+        genres = db.relationship('Genre', secondary=venue_genres, order_by='Genre.name')
         seeking_talent = db.Column(db.Boolean, default=False)
         seeking_description = db.Column(db.String(500))
-        artist = db.relationship('Artist', secondary=shows,
-            backref=db.backref('venues', lazy=True))
+        shows = db.relationship('Show', backref='venue', lazy=True,
+            cascade='all, delete-orphan', passive_deletes=True)
+        # Maintained by refresh_show_counters().
+        past_shows_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+        upcoming_shows_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+        next_show_time = db.Column(db.DateTime)
+        # Filled from the gazetteer by geo.location(); NULL for unknown cities.
+        latitude = db.Column(db.Float)
+        longitude = db.Column(db.Float)
+        geohash = db.Column(db.String(12))
 
         def __repr__(self):
-            return f'<Venue {self.id} {self.name} {self.city} {self.state} {self.address} {self.phone} {self.artist}>'
+            return f'<Venue {self.id} {self.name} {self.city} {self.state} {self.address} {self.phone}>'
+
+# /venues pages through venues by (state, city, id). Imports may leave city
+# and state NULL, and a row-value comparison with a NULL is never true, so
+# the keyset is on their coalesced values, and so is the index. The '' is
+# inlined: an index expression only matches a query with the same literal.
+venue_area = (db.func.coalesce(Venue.state, db.literal_column("''")),
+              db.func.coalesce(Venue.city, db.literal_column("''")))
+db.Index('ix_venues_area', *venue_area, Venue.id)
 
 class Artist(db.Model):
         __tablename__ = 'artists'
+        __table_args__ = (
+            db.Index('ix_artists_name_trgm', 'name', postgresql_using='gin',
+                postgresql_ops={'name': 'gin_trgm_ops'}),
+            db.Index('ix_artists_next_show_time', 'next_show_time'),
+        )
         id = db.Column(db.Integer, primary_key=True)
         name = db.Column(db.String)
         city = db.Column(db.String(120))
         state = db.Column(db.String(120))
         phone = db.Column(db.String(120))
-        genres = db.Column(db.String(120))
+        genres = db.relationship('Genre', secondary=artist_genres, order_by='Genre.name')
         image_link = db.Column(db.String(500))
         facebook_link = db.Column(db.String(120))
         website = db.Column(db.String(120))
         seeking_venue = db.Column(db.Boolean)
         seeking_description = db.Column(db.String())
+        shows = db.relationship('Show', backref='artist', lazy=True,
+            cascade='all, delete-orphan', passive_deletes=True)
+        # Maintained by refresh_show_counters().
+        past_shows_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+        upcoming_shows_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+        next_show_time = db.Column(db.DateTime)
 
         def __repr__(self):
-            return f'<Artist {self.id} {self.name} {self.city} {self.state} {self.phone} {self.genres}>'
+            return f'<Artist {self.id} {self.name} {self.city} {self.state} {self.phone}>'
 
 #----------------------------------------------------------------------------#
 # Filters.
 #----------------------------------------------------------------------------#
 
-def format_datetime(value, format='medium'):
-    date = dateutil.parser.parse(value)
-    if format == 'full':
-            format="EEEE MMMM, d, y 'at' h:mma"
-    elif format == 'medium':
-            format="EE MM, dd, y h:mma"
-    return babel.dates.format_datetime(date, format)
+DATETIME_FORMATS = {
+    'full': "EEEE MMMM, d, y 'at' h:mma",
+    'medium': "EE MM, dd, y h:mma"
+}
+
+@lru_cache(maxsize=64)
+def datetime_pattern(locale, format):
+    # Locale lookup and pattern parsing happen once per (locale, format)
+    # instead of once per rendered show.
+    import babel.dates
+    locale = babel.Locale.parse(locale or babel.dates.LC_TIME)
+    return locale, babel.dates.parse_pattern(DATETIME_FORMATS.get(format, format))
 
-app.jinja_env.filters['datetime'] = format_datetime
+def format_datetime(value, format='medium', locale=None):
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    if format in ('long', 'short'):
+        import babel.dates
+        return babel.dates.format_datetime(value, format, locale=locale or babel.dates.LC_TIME)
+    locale, pattern = datetime_pattern(locale, format)
+    return pattern.apply(value, locale)
 
 #----------------------------------------------------------------------------#
-# Controllers.
+# Queries.
 #----------------------------------------------------------------------------#
 
-@app.route('/')
-def index():
-    return render_template('pages/home.html')
+def request_now():
+    # One "now" per request, so every past/upcoming split in it agrees.
+    if 'now' not in g:
+        g.now = datetime.now()
+    return g.now
 
-#    Venues
-#    ----------------------------------------------------------------
+def genres_by_name(names):
+    # Reuses existing genre rows and creates the missing ones on flush.
+    names = list(dict.fromkeys(name for name in names if name))
+    found = {genre.name: genre for genre in Genre.query.filter(Genre.name.in_(names))} if names else {}
+    return [found.get(name) or Genre(name=name) for name in names]
+
+def with_genre(query, model, genre):
+    # Reads the genre's owners off the association table's (genre_id,
+    # owner_id) index. model.genres.any() would instead run a correlated
+    # EXISTS for every venue/artist row.
+    if not genre:
+        return query
+    link, key = {Venue: (venue_genres, 'venue_id'), Artist: (artist_genres, 'artist_id')}[model]
+    genre_id = db.select(Genre.id).where(Genre.name == genre).scalar_subquery()
+    return query.filter(model.id.in_(db.select(link.c[key]).where(link.c.genre_id == genre_id)))
+
+def encode_cursor(*values):
+    return base64.urlsafe_b64encode(json.dumps(values, default=str).encode()).decode()
+
+def decode_cursor(token, *types):
+    # Cursors are opaque to clients; anything that does not round-trip is a 400.
+    if token is None:
+        return None
+    try:
+        values = json.loads(base64.urlsafe_b64decode(token.encode()))
+        if len(values) != len(types):
+            raise ValueError(token)
+        return tuple(convert(value) for convert, value in zip(types, values))
+    except (ValueError, TypeError):
+        abort(400)
+
+def keyset_page(query, columns, key_of, limit, after=None, before=None):
+    # Seeks past the cursor on the (indexed) ordering columns instead of
+    # using OFFSET, so every page costs the same no matter how deep it is.
+    # The bound on the first column is implied by the row comparison; it is
+    # spelled out because SQLite only seeks an index for a row comparison
+    # on plain columns, not on expressions such as the venue area's.
+    key = db.tuple_(*columns)
+    if before is not None:
+        rows = query.filter(key < db.tuple_(*before), columns[0] <= before[0]) \
+            .order_by(*(column.desc() for column in columns)).limit(limit + 1).all()
+        has_prev, has_next = len(rows) > limit, True
+        rows = rows[:limit][::-1]
+    else:
+        if after is not None:
+            query = query.filter(key > db.tuple_(*after), columns[0] >= after[0])
+        rows = query.order_by(*columns).limit(limit + 1).all()
+        has_prev, has_next = after is not None, len(rows) > limit
+        rows = rows[:limit]
+    page = {
+        'limit': limit,
+        'prev': encode_cursor(*key_of(rows[0])) if rows and has_prev else None,
+        'next': encode_cursor(*key_of(rows[-1])) if rows and has_next else None
+    }
+    return rows, page
+
+def refresh_show_counters(model, column, now, ids=None, everything=False):
+    # Recomputes the show counters of the given venues/artists in one UPDATE.
+    # With no ids, only rows whose next show has already started are touched.
+    def shows_where(*criteria):
+        return db.select(db.func.count(Show.id)).where(db.and_(column == model.id, *criteria))
+    values = {
+        'past_shows_count': shows_where(Show.start_time <= now).scalar_subquery(),
+        'upcoming_shows_count': shows_where(Show.start_time > now).scalar_subquery(),
+        'next_show_time': db.select(db.func.min(Show.start_time)).where(
+            db.and_(column == model.id, Show.start_time > now)).scalar_subquery()
+    }
+    if everything:
+        query = model.query
+    elif ids is None:
+        query = model.query.filter(model.next_show_time <= now)
+    else:
+        query = model.query.filter(model.id.in_(ids))
+    return query.update(values, synchronize_session=False)
+
+def venues_by_area(genre=None, limit=None, after=None, before=None):
+    # Counts come from the venue rows themselves, so shows is never read.
+    state, city = venue_area
+    rows = db.session.query(
+        Venue.id,
+        Venue.name,
+        city,
+        state,
+        Venue.upcoming_shows_count
+    )
+    rows, page = keyset_page(with_genre(rows, Venue, genre),
+        (state, city, Venue.id), lambda row: (row[3], row[2], row[0]),
+        limit, after, before)
 
-@app.route('/venues')
-def venues():
-    shows_ = db.session.execute('SELECT * FROM shows;')
-    cities = []
-    for ven in Venue.query.all():
-        if ven.city not in cities:
-            cities.append(ven.city)
     areas = []
-    for city in cities:
-        vens_ = []
-        vens = Venue.query.filter_by(city=city).all()
-        for ven in vens:
-            n = 0
-            for show in shows_:
-                if show.venue_id == ven.id:
-                    if dateutil.parser.parse(str(show.start_time)) > datetime.now():
-                        n += 1
-            vens_.append({
-                'id': ven.id,
-                'name': ven.name,
-                'num_upcoming_shows': n
-            })
+    for (city, state), vens in groupby(rows, key=lambda row: (row[2], row[3])):
         areas.append({
             'city': city,
-            'state': vens[0].state,
-            'venues': vens_
+            'state': state,
+            'venues': [{
+                'id': ven_id,
+                'name': name,
+                'num_upcoming_shows': n
+            } for ven_id, name, _, _, n in vens]
         })
+    return areas, page
 
-    return render_template('pages/venues.html', areas=areas)
+def in_cell(cell):
+    low, high = geo.prefix_range(cell)
+    if high is None:
+        return Venue.geohash >= low
+    return db.and_(Venue.geohash >= low, Venue.geohash < high)
 
-@app.route('/venues/search', methods=['POST'])
-def search_venues():
-    search_term = str(request.form.get('search_term')).lower()
-    datas = Venue.query.all()
-    data = []
-    shows_ = db.session.execute('SELECT * FROM shows;')
-    for ven in datas:
-        if search_term in str(ven.name).lower():
-            past_shows = []
-            upcoming_shows = []
-            ven_shows = [ven_show for ven_show in shows_ if ven_show.venue_id == ven.id]
-            for ven_show in ven_shows:
-                if dateutil.parser.parse(str(ven_show.start_time)) > datetime.now():
-                    upcoming_shows.append({
-                        "artist": ven_show.artist_id,
-                        "artist": Artist.query.get(ven_show.artist_id).name,
-                        "artist_image_link": Artist.query.get(ven_show.artist_id).image_link,
-                        "start_time": str(ven_show.start_time)
-                    })
-                else:
-                    past_shows.append({
-                        "artist_id": ven_show.artist_id,
-                        "artist_name": Artist.query.get(ven_show.artist_id).name,
-                        "artist_image_link": Artist.query.get(ven_show.artist_id).image_link,
-                        "start_time": str(ven_show.start_time)
-                    })
-            data.append({
-                'id': ven.id,
-                'name': ven.name,
-                'genres': ast.literal_eval(ven.genres),
-                'past_shows': past_shows,
-                'upcoming_shows': upcoming_shows,
-                'past_shows_count': len(past_shows),
-                'upcoming_shows_count': len(upcoming_shows)
-            })
-    response={
-        "count": len(data),
-        "data": data
+def nearby_venues(latitude, longitude, radius_km, limit, upcoming_only=False):
+    # k nearest venues within radius_km, nearest first. Each pass reads only
+    # the geohash cells covering a circle (one index range scan per cell)
+    # and measures exact distances for those rows; the circle starts small
+    # and grows until it holds limit venues or reaches radius_km.
+    search_km = min(radius_km, 5.0)
+    while True:
+        cells = geo.covering_cells(latitude, longitude, search_km)
+        query = db.session.query(
+            Venue.id,
+            Venue.name,
+            Venue.city,
+            Venue.state,
+            Venue.latitude,
+            Venue.longitude,
+            Venue.upcoming_shows_count
+        ).filter(db.or_(*[in_cell(cell) for cell in cells]))
+        if upcoming_only:
+            query = query.filter(Venue.upcoming_shows_count > 0)
+        found = []
+        for row in query:
+            distance = geo.distance_km(latitude, longitude, row.latitude, row.longitude)
+            if distance <= search_km:
+                found.append((distance, row))
+        if len(found) >= limit or search_km >= radius_km:
+            return heapq.nsmallest(limit, found, key=lambda item: (item[0], item[1].id))
+        search_km = min(search_km * 4, radius_km)
+
+def escape_like(term):
+    return term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+def name_matches(model, search_term):
+    # Case-insensitive substring match. On PostgreSQL the ILIKE is served by
+    # the pg_trgm GIN index on name; SQLite renders lower(name) LIKE lower(?),
+    # with the Unicode-aware lower() that configure_sqlite installs.
+    return model.name.ilike('%' + escape_like(search_term) + '%', escape='\\')
+
+def search_by_name(model, search_term, offset, limit):
+    query = model.query.filter(name_matches(model, search_term))
+    return query.count(), query.order_by(model.id).offset(offset).limit(limit).all()
+
+def page_limit():
+    limit = request.values.get('limit', current_app.config['PAGE_SIZE'], type=int)
+    return min(max(limit, 1), current_app.config['MAX_PAGE_SIZE'])
+
+def page_args():
+    return max(request.values.get('offset', 0, type=int), 0), page_limit()
+
+def search_results(count, data, offset, limit):
+    return {
+        "count": count,
+        "data": data,
+        "limit": limit,
+        "prev_offset": max(offset - limit, 0) if offset > 0 else None,
+        "next_offset": offset + limit if offset + limit < count else None
     }
-    return render_template('pages/search_venues.html', results=response, search_term=request.form.get('search_term', ''))
 
-@app.route('/venues/<int:venue_id>')
-def show_venue(venue_id):
-    ven = Venue.query.get(venue_id)
-    shows_ = db.session.execute('SELECT * FROM shows;')
-    past_shows = []
-    upcoming_shows = []
-    ven_shows = [ven_show for ven_show in shows_ if ven_show.venue_id == ven.id]
-    for ven_show in ven_shows:
-        if dateutil.parser.parse(str(ven_show.start_time)) > datetime.now():
-            upcoming_shows.append({b
-                "artist_id": ven_show.artist_id,
-                "artist_name": Artist.query.get(ven_show.artist_id).name,
-                "artist_image_link": Artist.query.get(ven_show.artist_id).image_link,
-                "start_time": str(ven_show.start_time)
-            })
+def overlapping(start_time, end_time):
+    # Shows overlapping [start_time, end_time). The lower bound on
+    # start_time follows from MAX_SHOW_DURATION and is what makes this an
+    # index range scan rather than a scan of everything before end_time.
+    return db.and_(Show.start_time < end_time,
+                   Show.start_time > start_time - MAX_SHOW_DURATION,
+                   Show.end_time > start_time)
+
+def booking_conflicts(bookings):
+    '''Checks bookings (dicts with venue_id, artist_id, start_time and
+    end_time) against the schedule and each other, in order.
+
+    Returns (booking, reason) pairs for the bookings that overlap a show at
+    the same venue or by the same artist; reason is 'venue' or 'artist'.
+    '''
+    if not bookings:
+        return []
+    existing = db.session.query(Show.venue_id, Show.artist_id, Show.start_time, Show.end_time).filter(
+        db.or_(Show.venue_id.in_({booking['venue_id'] for booking in bookings}),
+               Show.artist_id.in_({booking['artist_id'] for booking in bookings})),
+        overlapping(min(booking['start_time'] for booking in bookings),
+                    max(booking['end_time'] for booking in bookings)))
+    # (kind, id) -> sorted list of (start_time, end_time).
+    schedule = {}
+    def book(venue_id, artist_id, start_time, end_time):
+        for key in (('venue', venue_id), ('artist', artist_id)):
+            intervals = schedule.setdefault(key, [])
+            intervals.insert(bisect_left(intervals, (start_time, end_time)), (start_time, end_time))
+    for row in existing:
+        book(*row)
+
+    conflicts = []
+    for booking in bookings:
+        start_time, end_time = booking['start_time'], booking['end_time']
+        for reason in ('venue', 'artist'):
+            if schedule_overlaps(schedule.get((reason, booking[reason + '_id']), []),
+                                 start_time, end_time):
+                conflicts.append((booking, reason))
+                break
         else:
-            past_shows.append({
-                "artist_id": ven_show.artist_id,
-                "artist_name": Artist.query.get(ven_show.artist_id).name,
-                "artist_image_link": Artist.query.get(ven_show.artist_id).image_link,
-                "start_time": str(ven_show.start_time)
-            })
-    data = ven.__dict__
-    data['genres'] = ast.literal_eval(ven.genres)
+            book(booking['venue_id'], booking['artist_id'], start_time, end_time)
+    return conflicts
+
+# Fields a booking record may carry; in a batch, ones given next to the
+# list of shows apply to every row (the artist of a tour, say).
+BOOKING_FIELDS = ('venue_id', 'artist_id', 'start_time', 'end_time', 'duration')
+
+def parse_booking(record):
+    '''A booking dict from a form or JSON record; raises ValueError.
+
+    The end is end_time, or start_time plus duration minutes (the default
+    show length when neither is given).
+    '''
+    try:
+        venue_id, artist_id = int(record['venue_id']), int(record['artist_id'])
+    except (KeyError, TypeError, ValueError):
+        raise ValueError('venue_id and artist_id are required')
+    try:
+        start_time = bulk.parse_datetime(record.get('start_time') or None)
+        end_time = bulk.parse_datetime(record.get('end_time') or None)
+        duration = timedelta(minutes=int(record.get('duration') or 0))
+    except (TypeError, ValueError, OverflowError):
+        raise ValueError('invalid start_time, end_time or duration')
+    if start_time is None:
+        raise ValueError('start_time is required')
+    if start_time.tzinfo is not None or (end_time is not None and end_time.tzinfo is not None):
+        raise ValueError('times are local to the venue and take no UTC offset')
+    if end_time is None:
+        try:
+            end_time = start_time + (duration or DEFAULT_SHOW_DURATION)
+        except OverflowError:
+            raise ValueError('a show must end after it starts and last at most 24 hours')
+    if not timedelta(0) < end_time - start_time <= MAX_SHOW_DURATION:
+        raise ValueError('a show must end after it starts and last at most 24 hours')
+    return {'venue_id': venue_id, 'artist_id': artist_id, 'start_time': start_time, 'end_time': end_time}
+
+def book_shows(records, partial=False):
+    '''Books shows in the current transaction; the caller commits.
+
+    Returns one result per record, in order: the booked show (with its id)
+    or {'index': i, 'error': reason}. Unless partial is set, a batch with
+    any error books nothing. All rows go out in one executemany of the same
+    bound INSERT, so the statement is compiled (and prepared) once.
+    '''
+    bookings, errors = [], {}
+    for index, record in enumerate(records):
+        try:
+            bookings.append(parse_booking(record))
+        except ValueError as e:
+            bookings.append(None)
+            errors[index] = str(e)
+    pending = [(index, booking) for index, booking in enumerate(bookings) if booking is not None]
+
+    known_venues = {ven_id for ven_id, in db.session.query(Venue.id).filter(
+        Venue.id.in_({booking['venue_id'] for _, booking in pending}))}
+    known_artists = {art_id for art_id, in db.session.query(Artist.id).filter(
+        Artist.id.in_({booking['artist_id'] for _, booking in pending}))}
+    for index, booking in pending:
+        if booking['venue_id'] not in known_venues:
+            errors[index] = 'unknown venue {}'.format(booking['venue_id'])
+        elif booking['artist_id'] not in known_artists:
+            errors[index] = 'unknown artist {}'.format(booking['artist_id'])
+    checked = [(index, booking) for index, booking in pending if index not in errors]
+    conflicts = {id(booking): reason for booking, reason in
+                 booking_conflicts([booking for _, booking in checked])}
+    for index, booking in checked:
+        if id(booking) in conflicts:
+            errors[index] = 'the {} is already booked at that time'.format(conflicts[id(booking)])
+
+    booked = [booking for index, booking in checked if index not in errors]
+    if errors and not partial:
+        for index, _ in checked:
+            errors.setdefault(index, 'not booked: other shows in the batch failed')
+        booked = []
+    if booked:
+        db.session.execute(Show.__table__.insert(), booked)
+        # Shows at one venue never overlap, so (venue_id, start_time) finds each.
+        ids = {(ven_id, start_time): show_id for show_id, ven_id, start_time in
+               db.session.query(Show.id, Show.venue_id, Show.start_time).filter(
+                   db.tuple_(Show.venue_id, Show.start_time).in_(
+                       [(booking['venue_id'], booking['start_time']) for booking in booked]))}
+        for booking in booked:
+            booking['id'] = ids[(booking['venue_id'], booking['start_time'])]
+        now = request_now()
+        refresh_show_counters(Venue, Show.venue_id, now, list({booking['venue_id'] for booking in booked}))
+        refresh_show_counters(Artist, Show.artist_id, now, list({booking['artist_id'] for booking in booked}))
+    return [{'index': index, 'error': errors[index]} if index in errors else dict(booking, index=index)
+            for index, booking in enumerate(bookings)]
+
+def commit_bookings(results):
+    # Commits what book_shows() booked and drops the pages showing it.
+    booked = [result for result in results if 'id' in result]
+    db.session.commit()
+    if booked:
+        keys = ['venue:{}'.format(ven_id) for ven_id in {result['venue_id'] for result in booked}] + \
+            ['artist:{}'.format(art_id) for art_id in {result['artist_id'] for result in booked}]
+        page_cache.invalidate(keys, lists=['venues', 'shows'])
+        warm_pages.delay(keys)
+    return len(booked)
+
+def book_and_commit(records, partial=False):
+    '''book_shows() then commit_bookings(); returns (results, booked count).
+
+    A concurrent booking can slip in between the conflict check and the
+    INSERT, and PostgreSQL's exclusion constraints then refuse it. After a
+    rollback the second try sees the other show and says which rows clash;
+    IntegrityError is raised only if that happens twice.
+    '''
+    for attempt in (1, 2):
+        try:
+            results = book_shows(records, partial)
+            return results, commit_bookings(results)
+        except IntegrityError:
+            db.session.rollback()
+            if attempt == 2:
+                raise
+
+def schedule_overlaps(intervals, start_time, end_time):
+    # intervals is sorted by start. The first one starting at or after
+    # start_time overlaps if it starts before end_time; earlier ones can
+    # only reach start_time if they started within MAX_SHOW_DURATION of it.
+    i = bisect_left(intervals, (start_time,))
+    if i < len(intervals) and intervals[i][0] < end_time:
+        return True
+    for k in range(i - 1, -1, -1):
+        other_start, other_end = intervals[k]
+        if other_start <= start_time - MAX_SHOW_DURATION:
+            return False
+        if other_end > start_time:
+            return True
+    return False
+
+def free_slots(venue_id, week_start, min_length=timedelta(0)):
+    # Gaps of at least min_length between the venue's shows in the week
+    # starting at week_start, from one indexed range scan.
+    week_end = week_start + timedelta(days=7)
+    busy = db.session.query(Show.start_time, Show.end_time).filter(
+        Show.venue_id == venue_id, overlapping(week_start, week_end)).order_by(Show.start_time)
+    slots, free_from = [], week_start
+    for start_time, end_time in busy:
+        if start_time - free_from >= max(min_length, timedelta.resolution):
+            slots.append((free_from, start_time))
+        free_from = max(free_from, end_time)
+    if week_end - free_from >= max(min_length, timedelta.resolution):
+        slots.append((free_from, week_end))
+    return slots
+
+def show_summary(show):
+    # Expects show.venue and show.artist to be eager-loaded.
+    return {
+        'venue_id': show.venue_id,
+        'venue_name': show.venue.name,
+        'venue_image_link': show.venue.image_link,
+        'artist_id': show.artist_id,
+        'artist_name': show.artist.name,
+        'artist_image_link': show.artist.image_link,
+        'start_time': show.start_time,
+        'end_time': show.end_time
+    }
+
+def partitioned_shows(column, ids, now):
+    # Maps each id in ids to a (past_shows, upcoming_shows) pair, loading
+    # every show with its venue and artist in a single joined statement.
+    result = {owner_id: ([], []) for owner_id in ids}
+    if not ids:
+        return result
+    query = Show.query.options(
+        db.joinedload(Show.venue),
+        db.joinedload(Show.artist)
+    ).filter(column.in_(ids)).order_by(Show.start_time)
+    for show in query:
+        past_shows, upcoming_shows = result[getattr(show, column.key)]
+        if show.start_time > now:
+            upcoming_shows.append(show_summary(show))
+        else:
+            past_shows.append(show_summary(show))
+    return result
+
+def entity_summary(entity):
+    return {
+        'id': entity.id,
+        'name': entity.name,
+        'num_upcoming_shows': entity.upcoming_shows_count,
+        'past_shows_count': entity.past_shows_count,
+        'upcoming_shows_count': entity.upcoming_shows_count
+    }
+
+def entity_detail(entity, past_shows, upcoming_shows):
+    data = {col.name: getattr(entity, col.name) for col in entity.__table__.columns}
+    data['genres'] = [genre.name for genre in entity.genres]
     data['past_shows'] = past_shows
     data['upcoming_shows'] = upcoming_shows
     data['past_shows_count'] = len(past_shows)
     data['upcoming_shows_count'] = len(upcoming_shows)
+    return data
+
+# View models shared by the HTML pages and the JSON API; they read paging
+# and filter parameters from the current request.
+
+def venue_listing():
+    cursor_types = (str, str, int)
+    return venues_by_area(request.args.get('genre'), page_limit(),
+        decode_cursor(request.args.get('after'), *cursor_types),
+        decode_cursor(request.args.get('before'), *cursor_types))
+
+def artist_listing():
+    return keyset_page(with_genre(Artist.query, Artist, request.args.get('genre')),
+        (Artist.id,), lambda art: (art.id,), page_limit(),
+        decode_cursor(request.args.get('after'), int),
+        decode_cursor(request.args.get('before'), int))
+
+def show_listing():
+    query = Show.query.options(db.joinedload(Show.venue), db.joinedload(Show.artist))
+    cursor_types = (datetime.fromisoformat, int)
+    shows_, page = keyset_page(query, (Show.start_time, Show.id),
+        lambda show: (show.start_time, show.id), page_limit(),
+        decode_cursor(request.args.get('after'), *cursor_types),
+        decode_cursor(request.args.get('before'), *cursor_types))
+    return [show_summary(show) for show in shows_], page
+
+# The ASGI adapter (asgi.py) may already have loaded a view model with
+# concurrent async queries; it hands it over in g.prefetched.
+
+def detail_page(model, column, entity_id):
+    if 'prefetched' in g:
+        return g.pop('prefetched')
+    entity = model.query.get_or_404(entity_id)
+    past_shows, upcoming_shows = partitioned_shows(column, [entity.id], request_now())[entity.id]
+    return entity_detail(entity, past_shows, upcoming_shows)
+
+def search_page(model):
+    if 'prefetched' in g:
+        return g.pop('prefetched')
+    offset, limit = page_args()
+    count, rows = search_by_name(model, request.values.get('search_term', ''), offset, limit)
+    return search_results(count, [entity_summary(row) for row in rows], offset, limit)
+
+#----------------------------------------------------------------------------#
+# Cache.
+#----------------------------------------------------------------------------#
+
+def stream_template(template_name, **context):
+    # Renders incrementally: the layout head goes out while the rows are
+    # still being rendered. Flashed messages are popped from the session
+    # now, because the session cookie is written before the body streams.
+    get_flashed_messages()
+    current_app.update_template_context(context)
+    template = current_app.jinja_env.get_template(template_name)
+    chunks = buffered(template.generate(context), current_app.config['TEMPLATE_STREAM_CHUNK_SIZE'])
+    return Response(stream_with_context(chunks), mimetype='text/html')
+
+def buffered(strings, size):
+    parts, length = [], 0
+    for string in strings:
+        parts.append(string)
+        length += len(string)
+        if length >= size:
+            yield ''.join(parts)
+            parts, length = [], 0
+    if parts:
+        yield ''.join(parts)
+
+def cache_stream(key, chunks):
+    # Passes a streamed page through and caches it once it is complete.
+    parts = []
+    for chunk in chunks:
+        parts.append(chunk)
+        yield chunk
+    page_cache.set(key, '{}:{}'.format(int(time.time()), ''.join(parts)))
+
+def cached_page(key_func):
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            # Pages carrying flashed messages are per-user; never share them.
+            # Neither are those of a client pinned to the primary after a
+            # write: the shared copy may have been rendered from a replica
+            # that has not caught up yet.
+            if not current_app.config['CACHE_ENABLED'] or session.get('_flashes') \
+                    or replica_routing.reads_primary():
+                return view(*args, **kwargs)
+            key = key_func(*args, **kwargs)
+            entry = page_cache.get(key)
+            if entry is None:
+                # Every client gets this copy until the next invalidation, so
+                # it is rendered from the primary: a replica that has not yet
+                # caught up with the write that caused the miss would
+                # otherwise have its old data cached as the new generation.
+                replica_routing.use_primary()
+                page = view(*args, **kwargs)
+                if isinstance(page, Response) and page.is_streamed and page.status_code == 200:
+                    page.response = stream_with_context(cache_stream(key, page.response))
+                    return page
+                if not isinstance(page, str):
+                    return page
+                rendered_at = int(time.time())
+                page_cache.set(key, '{}:{}'.format(rendered_at, page))
+            else:
+                rendered_at, page = entry.split(':', 1)
+            # The render time doubles as Last-Modified for conditional GETs.
+            response = make_response(page)
+            response.last_modified = int(rendered_at)
+            return response
+        wrapper.cache_key = key_func
+        return wrapper
+    return decorator
+
+def conditional_html(response):
+    # Pages are revalidated on every view; an unchanged one costs a 304
+    # instead of the full HTML.
+    if request.method in ('GET', 'HEAD') and response.status_code == 200 \
+            and response.mimetype == 'text/html' and not response.is_streamed:
+        response.cache_control.no_cache = True
+        response.add_etag()
+        response = response.make_conditional(request)
+    return response
+
+def list_page_key(name):
+    return lambda *args, **kwargs: page_cache.list_key(name, request.query_string.decode())
+
+# Create forms hold nothing per user (flashes bypass the cache), so each
+# is rendered once per form class; the show form's pickers also change
+# whenever a venue or artist does.
+def form_page_key(name, *lists):
+    return lambda: 'form:{}:{}'.format(name, ':'.join(page_cache.list_key(list_) for list_ in lists))
+
+def stale_lookup(generation, loaded_generation, loaded_at):
+    # Lookups built from a table are current until the list's cache
+    # generation moves, which every create/edit/delete here does. With the
+    # per-process LRU cache, writes by other workers and CLI imports do not
+    # move it, so NAME_INDEX_TTL also bounds how long a lookup is trusted.
+    return generation != loaded_generation or \
+        time.monotonic() - loaded_at > current_app.config['NAME_INDEX_TTL']
+
+def picker_choices(model):
+    # (id, label) options for the show form, by name.
+    pickers = current_app.extensions['fyyur']['pickers']
+    generation = page_cache.list_key(model.__tablename__)
+    cached = pickers.get(model.__tablename__)
+    if cached is None or stale_lookup(generation, cached[0], cached[1]):
+        # From the primary: a lagging replica would pin stale choices to
+        # the new generation.
+        with replica_routing.primary():
+            choices = tuple((str(entity_id), '{} (#{})'.format(name, entity_id)) for entity_id, name in
+                            db.session.query(model.id, model.name).order_by(model.name, model.id).all())
+        cached = pickers[model.__tablename__] = (generation, time.monotonic(), choices)
+    return cached[2]
+
+def name_index(model):
+    # The write handlers keep the index current through index_name(); it is
+    # reloaded from the table once it has missed a write or outlived
+    # NAME_INDEX_TTL (see stale_lookup).
+    index = current_app.extensions['fyyur']['name_indexes'][model.__tablename__]
+    generation = page_cache.generation(model.__tablename__)
+    if stale_lookup(generation, index.generation, index.loaded_at):
+        with replica_routing.primary():
+            index.rebuild(db.session.query(model.id, model.name).all(), generation)
+    return index
+
+def index_name(model, entity_id, name=None):
+    # Call after page_cache.invalidate() has bumped the model's list: the
+    # entry is added/renamed (or removed when name is None) in place, unless
+    # the index had already fallen behind, in which case it is left to reload.
+    index = current_app.extensions['fyyur']['name_indexes'][model.__tablename__]
+    generation = page_cache.generation(model.__tablename__)
+    if index.generation != generation - 1:
+        return
+    if name is None:
+        index.remove(entity_id)
+    else:
+        index.add(entity_id, name)
+    index.generation = generation
+
+def autocomplete(model):
+    # ?q=mus&limit=5 -> {"data": [{"id": 1, "name": "The Musical Hop"}, ...]}
+    limit = min(max(request.args.get('limit', current_app.config['AUTOCOMPLETE_LIMIT'], type=int), 1),
+                current_app.config['MAX_PAGE_SIZE'])
+    matches = name_index(model).search(request.args.get('q', ''), limit)
+    return json_response({'data': [{'id': entity_id, 'name': name} for entity_id, name in matches]})
+
+def partner_ids(column, partner_column, entity_id):
+    return [partner_id for partner_id, in
+            db.session.query(partner_column).filter(column == entity_id).distinct()]
+
+def venue_page_keys(venue_id, artist_ids=None):
+    # The venue page plus every artist page listing a show there.
+    if artist_ids is None:
+        artist_ids = partner_ids(Show.venue_id, Show.artist_id, venue_id)
+    return ['venue:{}'.format(venue_id)] + ['artist:{}'.format(art_id) for art_id in artist_ids]
+
+def artist_page_keys(artist_id):
+    venue_ids = partner_ids(Show.artist_id, Show.venue_id, artist_id)
+    return ['artist:{}'.format(artist_id)] + ['venue:{}'.format(ven_id) for ven_id in venue_ids]
+
+#----------------------------------------------------------------------------#
+# Jobs.
+#----------------------------------------------------------------------------#
+
+# Follow-up work of the write handlers, run by the job queue once the
+# response is out. Arguments are plain JSON values.
+
+# Cache key prefix -> (endpoint, argument) of the detail page.
+DETAIL_PAGES = {'venue': ('venues.show_venue', 'venue_id'), 'artist': ('artists.show_artist', 'artist_id')}
+
+@jobs.task
+def warm_pages(keys):
+    # Renders dropped detail pages ahead of the next visitor. Reads come
+    # from the primary: no request routes this context to a replica.
+    if not current_app.config['CACHE_ENABLED']:
+        return
+    for key in keys:
+        if page_cache.backend.get(key) is not None:
+            continue
+        prefix, entity_id = key.split(':')
+        endpoint, argument = DETAIL_PAGES[prefix]
+        # The page's own URL, so request.endpoint (the layout's search box
+        # and nav) is the same as when a visitor renders it.
+        path = current_app.url_map.bind('').build(endpoint, {argument: int(entity_id)})
+        with current_app.test_request_context(path):
+            try:
+                current_app.view_functions[endpoint](**{argument: int(entity_id)})
+            except HTTPException:
+                # Deleted since the job was queued.
+                pass
+
+@jobs.task
+def refresh_related_pages(kind, entity_id):
+    # After an edit: the pages of its partners (artists playing the venue,
+    # venues the artist plays) show its name and image too.
+    keys = venue_page_keys(entity_id) if kind == 'venues' else artist_page_keys(entity_id)
+    page_cache.invalidate(keys[1:])
+    warm_pages(keys)
+
+@jobs.task
+def check_image_link(kind, entity_id):
+    # Logs image links that are gone or do not point at an image. Links to
+    # non-public addresses are refused, not fetched. Network errors and 5xx
+    # answers raise, so the job is retried with backoff.
+    import links
+    model = {'venues': Venue, 'artists': Artist}[kind]
+    link = db.session.query(model.image_link).filter(model.id == entity_id).scalar()
+    if not link:
+        return
+    try:
+        status, content_type = links.head(link, current_app.config['IMAGE_CHECK_TIMEOUT'])
+    except links.UnsafeLink as e:
+        current_app.logger.warning('%s %s: image link %s not checked: %s', kind, entity_id, link, e)
+        return
+    if status >= 500:
+        raise RuntimeError('{} answered {}'.format(link, status))
+    if status in (404, 410):
+        current_app.logger.warning('%s %s: image link %s is gone (%s)', kind, entity_id, link, status)
+    elif 200 <= status < 300 and not content_type.startswith('image/'):
+        current_app.logger.warning('%s %s: image link %s is %s, not an image', kind, entity_id, link, content_type)
+
+def after_save(kind, entity_id, edited=False):
+    # Queues the follow-up work of a create or edit.
+    if edited:
+        refresh_related_pages.delay(kind, entity_id)
+    if current_app.config['CHECK_IMAGE_LINKS']:
+        check_image_link.delay(kind, entity_id)
+
+#----------------------------------------------------------------------------#
+# Controllers.
+#----------------------------------------------------------------------------#
+
+def index():
+    return render_template('pages/home.html')
+
+def cache_stats():
+    return page_cache.stats()
+
+#    Venues
+#    ----------------------------------------------------------------
+
+venue_pages = Blueprint('venues', __name__)
+artist_pages = Blueprint('artists', __name__)
+show_pages = Blueprint('shows', __name__)
+
+@venue_pages.route('/venues')
+@cached_page(list_page_key('venues'))
+def venues():
+    areas, page = venue_listing()
+    return stream_template('pages/venues.html', areas=areas, page=page)
+
+@venue_pages.route('/venues/search', methods=['POST'])
+@replica_reads
+def search_venues():
+    response = search_page(Venue)
+    return render_template('pages/search_venues.html', results=response, search_term=request.form.get('search_term', ''))
+
+@venue_pages.route('/autocomplete/venues')
+def autocomplete_venues():
+    return autocomplete(Venue)
+
+@venue_pages.route('/venues/<int:venue_id>')
+@cached_page(lambda venue_id: 'venue:{}'.format(venue_id))
+def show_venue(venue_id):
+    data = detail_page(Venue, Show.venue_id, venue_id)
 
     return render_template('pages/show_venue.html', venue=data)
 
 #    Create Venue
 #    ----------------------------------------------------------------
 
-@app.route('/venues/create', methods=['GET'])
+@venue_pages.route('/venues/create', methods=['GET'])
+@cached_page(form_page_key('new_venue'))
 def create_venue_form():
+    from forms import VenueForm
     form = VenueForm()
     return render_template('forms/new_venue.html', form=form)
 
-@app.route('/venues/create', methods=['POST'])
+@venue_pages.route('/venues/create', methods=['POST'])
 def create_venue_submission():
+    from forms import invalid_choices
+    invalid = invalid_choices(request.form)
+    if invalid:
+        flash('Venue {} could not be listed: unknown {}.'.format(request.form.get('name'), ' and '.join(invalid)), 'error')
+        return render_template('pages/home.html')
     try:
         req = request.form
         new_venue = Venue(
@@ -221,13 +959,19 @@ def create_venue_submission():
             phone = req.get('phone'),
             image_link = req.get('image_link'),
             facebook_link = req.get('facebook_link', ''),
-            genres = '[\"' + '\", \"'.join(req.getlist("genres")) + '\"]',
+            genres = genres_by_name(req.getlist('genres')),
             website = req.get('website_link', ''),
             seeking_talent = req.get('seeking_description', '')!='',
-            seeking_description = req.get('seeking_description')
+            seeking_description = req.get('seeking_description'),
+            **geo.location(req.get('city'), req.get('state'))
         )
         db.session.add(new_venue)
+        db.session.flush()
+        venue_id = new_venue.id
         db.session.commit()
+        page_cache.invalidate(lists=['venues'])
+        index_name(Venue, venue_id, req.get('name'))
+        after_save('venues', venue_id)
         flash('Venue ' + request.form['name'] + ' was successfully listed!')
     except:
         print(sys.exc_info())
@@ -237,14 +981,20 @@ def create_venue_submission():
         db.session.close()
     return render_template('pages/home.html')
 
-@app.route('/venues/<venue_id>', methods=['DELETE'])
+@venue_pages.route('/venues/<int:venue_id>', methods=['DELETE'])
 def delete_venue(venue_id):
     body = {}
     try:
         ven = Venue.query.get(venue_id)
-        db.session.execute('DELETE FROM shows WHERE venue_id = ' + str(venue_id))
+        artist_ids = partner_ids(Show.venue_id, Show.artist_id, ven.id)
+        keys = venue_page_keys(ven.id, artist_ids)
         db.session.delete(ven)
+        db.session.flush()
+        refresh_show_counters(Artist, Show.artist_id, request_now(), artist_ids)
         db.session.commit()
+        page_cache.invalidate(keys, lists=['venues', 'shows'])
+        index_name(Venue, venue_id)
+        warm_pages.delay(keys[1:])
         body['success'] = True
     except Exception as e:
         db.session.rollback()
@@ -258,101 +1008,51 @@ def delete_venue(venue_id):
 #    Artists
 #    ----------------------------------------------------------------
 
-@app.route('/artists')
+@artist_pages.route('/artists')
+@cached_page(list_page_key('artists'))
 def artists():
-    data = Artist.query.order_by('id').all()
-    return render_template('pages/artists.html', artists=data)
+    data, page = artist_listing()
+    return stream_template('pages/artists.html', artists=data, page=page)
 
-@app.route('/artists/search', methods=['POST'])
+@artist_pages.route('/artists/search', methods=['POST'])
+@replica_reads
 def search_artists():
-    search_term = str(request.form.get('search_term')).lower()
-    datas = Artist.query.all()
-    data = []
-    shows_ = db.session.execute('SELECT * FROM shows;')
-
-    for art in datas:
-        if search_term in str(art.name).lower():
-            art.genres = ast.literal_eval(art.genres)
-            past_shows = []
-            upcoming_shows = []
-            art_shows = [art_show for art_show in shows_ if art_show.artist_id == art.id]
-            for art_show in art_shows:
-                if dateutil.parser.parse(str(art_show.start_time)) > datetime.now():
-                    upcoming_shows.append({
-                        "venue_id": art_show.venue_id,
-                        "venue_name": Venue.query.get(art_show.venue_id).name,
-                        "venue_image_link": Venue.query.get(art_show.venue_id).image_link,
-                        "start_time": str(art_show.start_time)
-                    })
-                else:
-                    past_shows.append({
-                        "venue_id": art_show.venue_id,
-                        "venue_name": Venue.query.get(art_show.venue_id).name,
-                        "venue_image_link": Venue.query.get(art_show.venue_id).image_link,
-                        "start_time": str(art_show.start_time)
-                    })
-            data.append({
-                "id": art.id,
-                "name": art.name,
-                'past_shows': past_shows,
-                'upcoming_shows': upcoming_shows,
-                'past_shows_count': len(past_shows),
-                'upcoming_shows_count': len(upcoming_shows)
-            })
-
-    response={
-        "count": len(data),
-        "data": data
-    }
+    response = search_page(Artist)
     return render_template('pages/search_artists.html', results=response, search_term=request.form.get('search_term', ''))
 
-@app.route('/artists/<int:artist_id>')
+@artist_pages.route('/autocomplete/artists')
+def autocomplete_artists():
+    return autocomplete(Artist)
+
+@artist_pages.route('/artists/<int:artist_id>')
+@cached_page(lambda artist_id: 'artist:{}'.format(artist_id))
 def show_artist(artist_id):
-    art = Artist.query.get(artist_id)
-    art.genres = ast.literal_eval(art.genres)
-    shows_ = db.session.execute('SELECT * FROM shows;')
-    past_shows = []
-    upcoming_shows = []
-    art_shows = [art_show for art_show in shows_ if art_show.artist_id == art.id]
-    for art_show in art_shows:
-        if dateutil.parser.parse(str(art_show.start_time)) > datetime.now():
-            upcoming_shows.append({
-                "venue_id": art_show.venue_id,
-                "venue_name": Venue.query.get(art_show.venue_id).name,
-                "venue_image_link": Venue.query.get(art_show.venue_id).image_link,
-                "start_time": str(art_show.start_time)
-            })
-        else:
-            past_shows.append({
-                "venue_id": art_show.venue_id,
-                "venue_name": Venue.query.get(art_show.venue_id).name,
-                "venue_image_link": Venue.query.get(art_show.venue_id).image_link,
-                "start_time": str(art_show.start_time)
-            })
-    data = art.__dict__
-    data['past_shows'] = past_shows
-    data['upcoming_shows'] = upcoming_shows
-    data['past_shows_count'] = len(past_shows)
-    data['upcoming_shows_count'] = len(upcoming_shows)
+    data = detail_page(Artist, Show.artist_id, artist_id)
 
     return render_template('pages/show_artist.html', artist=data)
 
 #    Update
 #    ----------------------------------------------------------------
-@app.route('/artists/<int:artist_id>/edit', methods=['GET'])
+@artist_pages.route('/artists/<int:artist_id>/edit', methods=['GET'])
 def edit_artist(artist_id):
+    from forms import ArtistForm
     form = ArtistForm()
     artist = Artist.query.get(artist_id)
     return render_template('forms/edit_artist.html', form=form, artist=artist)
 
-@app.route('/artists/<int:artist_id>/edit', methods=['POST'])
+@artist_pages.route('/artists/<int:artist_id>/edit', methods=['POST'])
 def edit_artist_submission(artist_id):
+    from forms import invalid_choices
     req = request.form
+    invalid = invalid_choices(req)
+    if invalid:
+        flash('Artist could not be updated: unknown {}.'.format(' and '.join(invalid)), 'error')
+        return redirect(url_for('artists.edit_artist', artist_id=artist_id))
     art = Artist.query.get(artist_id)
     art.name = req.get('name')
     art.city = req.get('city')
     art.state = req.get('state')
-    art.genres = '[\"' + '\", \"'.join(req.getlist('genres')) + '\"]'
+    art.genres = genres_by_name(req.getlist('genres'))
     art.facebook_link = req.get('facebook_link')
     art.website = req.get('website')
     art.image_link = req.get('image_link')
@@ -360,45 +1060,66 @@ def edit_artist_submission(artist_id):
     art.seeking_description = req.get('seeking_description')
     db.session.commit()
     db.session.close()
+    page_cache.invalidate(['artist:{}'.format(artist_id)], lists=['artists', 'shows'])
+    index_name(Artist, artist_id, req.get('name'))
+    after_save('artists', artist_id, edited=True)
 
-    return redirect(url_for('show_artist', artist_id=artist_id))
+    return redirect(url_for('artists.show_artist', artist_id=artist_id))
 
-@app.route('/venues/<int:venue_id>/edit', methods=['GET'])
+@venue_pages.route('/venues/<int:venue_id>/edit', methods=['GET'])
 def edit_venue(venue_id):
+    from forms import VenueForm
     form = VenueForm()
     venue = Venue.query.get(venue_id)
     return render_template('forms/edit_venue.html', form=form, venue=venue)
 
-@app.route('/venues/<int:venue_id>/edit', methods=['POST'])
+@venue_pages.route('/venues/<int:venue_id>/edit', methods=['POST'])
 def edit_venue_submission(venue_id):
+    from forms import invalid_choices
     req = request.form
+    invalid = invalid_choices(req)
+    if invalid:
+        flash('Venue could not be updated: unknown {}.'.format(' and '.join(invalid)), 'error')
+        return redirect(url_for('venues.edit_venue', venue_id=venue_id))
     venue = Venue.query.get(venue_id)
     venue.name = req.get('name')
     venue.city = req.get('city')
     venue.state = req.get('state')
     venue.address = req.get('address')
     venue.phone = req.get('phone')
-    venue.genres = '[\"' + '\", \"'.join(req.getlist('genres')) + '\"]'
+    venue.genres = genres_by_name(req.getlist('genres'))
     venue.facebook_link = req.get('facebook_link')
     venue.website = req.get('website_link')
     venue.image_link = req.get('image_link')
     venue.seeking_venue = req.get('seeking_description')!=''
     venue.seeking_description = req.get('seeking_description')
+    for column, value in geo.location(venue.city, venue.state).items():
+        setattr(venue, column, value)
     db.session.commit()
     db.session.close()
+    page_cache.invalidate(['venue:{}'.format(venue_id)], lists=['venues', 'shows'])
+    index_name(Venue, venue_id, req.get('name'))
+    after_save('venues', venue_id, edited=True)
 
-    return redirect(url_for('show_venue', venue_id=venue_id))
+    return redirect(url_for('venues.show_venue', venue_id=venue_id))
 
 #    Create Artist
 #    ----------------------------------------------------------------
 
-@app.route('/artists/create', methods=['GET'])
+@artist_pages.route('/artists/create', methods=['GET'])
+@cached_page(form_page_key('new_artist'))
 def create_artist_form():
+    from forms import ArtistForm
     form = ArtistForm()
     return render_template('forms/new_artist.html', form=form)
 
-@app.route('/artists/create', methods=['POST'])
+@artist_pages.route('/artists/create', methods=['POST'])
 def create_artist_submission():
+    from forms import invalid_choices
+    invalid = invalid_choices(request.form)
+    if invalid:
+        flash('Artist {} could not be listed: unknown {}.'.format(request.form.get('name'), ' and '.join(invalid)), 'error')
+        return render_template('pages/home.html')
     try:
         new_artist = Artist(
             name = request.form.get('name'),
@@ -410,10 +1131,15 @@ def create_artist_submission():
             seeking_venue = request.form.get('seeking_description')!='',
             seeking_description = request.form.get('seeking_description'),
             website = request.form.get('website'),
-            genres = '[\"' + '\", \"'.join(list(request.form.getlist('genres'))) + '"]'
+            genres = genres_by_name(request.form.getlist('genres'))
         )
         db.session.add(new_artist)
+        db.session.flush()
+        artist_id = new_artist.id
         db.session.commit()
+        page_cache.invalidate(lists=['artists'])
+        index_name(Artist, artist_id, request.form.get('name'))
+        after_save('artists', artist_id)
         flash('Artist ' + request.form.get('name') + ' was successfully listed!')
     except:
         print(sys.exc_info())
@@ -427,41 +1153,32 @@ def create_artist_submission():
 #    Shows
 #    ----------------------------------------------------------------
 
-@app.route('/shows')
+@show_pages.route('/shows')
+@cached_page(list_page_key('shows'))
 def shows():
-    shows_ = db.session.execute('SELECT * FROM shows;')
-    data = []
-
-    for show in shows_:
-        ven = Venue.query.get(show.venue_id)
-        art = Artist.query.get(show.artist_id)
-        data_dict = {
-            "venue_id": show.venue_id,
-            "venue_name": ven.name,
-            "artist_id": show.artist_id,
-            "artist_name": art.name,
-            "artist_image_link": art.image_link,
-            "start_time": str(show.start_time)
-        }
-        data.append(data_dict)
-
-    return render_template('pages/shows.html', shows=data)
-
-@app.route('/shows/create')
+    data, page = show_listing()
+
+    return stream_template('pages/shows.html', shows=data, page=page)
+
+@show_pages.route('/shows/create')
+@cached_page(form_page_key('new_show', 'venues', 'artists'))
 def create_shows():
-    # renders form. do not touch.
+    from forms import ShowForm
     form = ShowForm()
+    form.artist_id.choices = (('', 'Choose an artist'),) + picker_choices(Artist)
+    form.venue_id.choices = (('', 'Choose a venue'),) + picker_choices(Venue)
     return render_template('forms/new_show.html', form=form)
 
-@app.route('/shows/create', methods=['POST'])
+@show_pages.route('/shows/create', methods=['POST'])
 def create_show_submission():
     try:
-        ven = request.form.get('venue_id')
-        art = request.form.get('artist_id')
-        s_t = str(request.form.get('start_time'))
-        db.session.execute(f'INSERT INTO shows (artist_id, venue_id, start_time) VALUES ({art}, {ven}, \'{s_t}\');')
-        db.session.commit()
-        flash('Show was successfully listed!')
+        (result,), _ = book_and_commit([request.form])
+        if 'error' in result:
+            flash('Show could not be listed: {}.'.format(result['error']))
+        else:
+            flash('Show was successfully listed!')
+    except IntegrityError:
+        flash('Show could not be listed: it clashes with a concurrent change; try again.')
     except:
         db.session.rollback()
         print(sys.exc_info())
@@ -470,16 +1187,496 @@ def create_show_submission():
         db.session.close()
     return render_template('pages/home.html')
 
-@app.errorhandler(404)
+#    JSON API
+#    ----------------------------------------------------------------
+
+api = Blueprint('api', __name__, url_prefix='/api/v1')
+
+def json_response(data):
+    response = Response(json.dumps(data, default=str), mimetype='application/json')
+    response.add_etag()
+    return response.make_conditional(request)
+
+def streamed_json_response(name, build):
+    # The ETag comes from the list's cache generation (bumped on every write)
+    # and the current TTL window, so a revalidation is answered with a 304
+    # before any query runs. The body is serialized one item at a time.
+    window = int(time.time() // current_app.config['CACHE_TTL'])
+    key = '{}:{}'.format(page_cache.list_key(name, request.query_string.decode()), window)
+    etag = hashlib.md5(key.encode()).hexdigest()
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+        response.set_etag(etag)
+        return response
+    items, page = build()
+
+    def generate():
+        yield '{"data": ['
+        for i, item in enumerate(items):
+            yield (',' if i else '') + json.dumps(item, default=str)
+        yield '], "page": ' + json.dumps(page) + '}'
+
+    response = Response(stream_with_context(generate()), mimetype='application/json')
+    response.set_etag(etag)
+    return response
+
+@api.route('/venues')
+def api_venues():
+    return streamed_json_response('venues', venue_listing)
+
+@api.route('/venues/search', methods=['GET', 'POST'])
+@replica_reads
+def api_search_venues():
+    return json_response(search_page(Venue))
+
+@api.route('/venues/nearby')
+def api_nearby_venues():
+    # ?lat=37.77&lng=-122.42 or ?city=San Francisco&state=CA, plus optional
+    # ?radius_km=20, ?limit= and ?upcoming=1 (only venues with upcoming shows).
+    latitude = request.args.get('lat', type=float)
+    longitude = request.args.get('lng', type=float)
+    if latitude is None or longitude is None:
+        point = geo.geocode(request.args.get('city'), request.args.get('state'))
+        if point is None:
+            abort(400)
+        latitude, longitude = point
+    if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+        abort(400)
+    radius_km = min(max(request.args.get('radius_km', 20.0, type=float), 0.0), 20000.0)
+    upcoming_only = request.args.get('upcoming', '') not in ('', '0', 'false')
+    venues_ = nearby_venues(latitude, longitude, radius_km, page_limit(), upcoming_only)
+    return json_response({
+        'latitude': latitude,
+        'longitude': longitude,
+        'radius_km': radius_km,
+        'data': [{
+            'id': ven.id,
+            'name': ven.name,
+            'city': ven.city,
+            'state': ven.state,
+            'latitude': ven.latitude,
+            'longitude': ven.longitude,
+            'distance_km': round(distance, 3),
+            'num_upcoming_shows': ven.upcoming_shows_count
+        } for distance, ven in venues_]
+    })
+
+@api.route('/venues/<int:venue_id>')
+def api_show_venue(venue_id):
+    return json_response(detail_page(Venue, Show.venue_id, venue_id))
+
+@api.route('/venues/<int:venue_id>/free-slots')
+def api_venue_free_slots(venue_id):
+    # ?week=2026-W42 (ISO week, Monday 00:00 to Monday 00:00; defaults to
+    # the current week) and optionally ?min_minutes=60.
+    if db.session.query(Venue.id).filter(Venue.id == venue_id).scalar() is None:
+        abort(404)
+    week = request.args.get('week') or request_now().strftime('%G-W%V')
+    try:
+        week_start = datetime.strptime(week + '-1', '%G-W%V-%u')
+    except ValueError:
+        abort(400)
+    min_length = timedelta(minutes=max(request.args.get('min_minutes', 0, type=int), 0))
+    return json_response({
+        'venue_id': venue_id,
+        'week': week,
+        'slots': [{'start_time': start_time, 'end_time': end_time}
+                  for start_time, end_time in free_slots(venue_id, week_start, min_length)]
+    })
+
+@api.route('/artists')
+def api_artists():
+    def build():
+        arts, page = artist_listing()
+        return ({'id': art.id, 'name': art.name} for art in arts), page
+    return streamed_json_response('artists', build)
+
+@api.route('/artists/search', methods=['GET', 'POST'])
+@replica_reads
+def api_search_artists():
+    return json_response(search_page(Artist))
+
+@api.route('/artists/<int:artist_id>')
+def api_show_artist(artist_id):
+    return json_response(detail_page(Artist, Show.artist_id, artist_id))
+
+@api.route('/shows')
+def api_shows():
+    return streamed_json_response('shows', show_listing)
+
+@api.route('/shows', methods=['POST'])
+def api_book_shows():
+    # One show as a JSON object, or a batch as {"shows": [...]}. Fields next
+    # to "shows" apply to every row, so a tour is {"artist_id": 4, "shows":
+    # [{"venue_id": 1, "start_time": ...}, ...]}. The batch is booked in one
+    # transaction, all or nothing unless "partial": true; every row gets a
+    # result with its show id or the reason it was refused.
+    body = request.get_json(silent=True)
+    if not isinstance(body, dict):
+        abort(400)
+    if 'shows' in body:
+        if not isinstance(body['shows'], list) or len(body['shows']) > current_app.config['MAX_BOOKING_BATCH']:
+            abort(400)
+        defaults = {field: body[field] for field in BOOKING_FIELDS if field in body}
+        records = [dict(defaults, **row) if isinstance(row, dict) else {} for row in body['shows']]
+    else:
+        records = [body]
+    status = None
+    try:
+        results, booked = book_and_commit(records, partial=body.get('partial') is True)
+    except IntegrityError:
+        results, booked, status = [{'index': index, 'error': 'clashes with a concurrent change; try again'}
+                                   for index in range(len(records))], 0, 409
+    except:
+        db.session.rollback()
+        raise
+    finally:
+        db.session.close()
+    return Response(json.dumps({'booked': booked, 'results': results}, default=str),
+                    status=status or (201 if booked else 422), mimetype='application/json')
+
+@api.errorhandler(400)
+def api_bad_request_error(error):
+    return {'error': 400, 'message': 'Bad request'}, 400
+
+@api.errorhandler(404)
+def api_not_found_error(error):
+    return {'error': 404, 'message': 'Not found'}, 404
+
+#    CLI
+#    ----------------------------------------------------------------
+
+fyyur_cli = AppGroup('fyyur', help='Fyyur maintenance commands.')
+
+@fyyur_cli.command('roll-shows')
+@click.option('--all', 'everything', is_flag=True, help='Recompute every venue and artist.')
+def roll_shows(everything):
+    '''Move shows that have started from upcoming to past in the counters.'''
+    now = datetime.now()
+    venues_ = refresh_show_counters(Venue, Show.venue_id, now, everything=everything)
+    artists_ = refresh_show_counters(Artist, Show.artist_id, now, everything=everything)
+    db.session.commit()
+    page_cache.invalidate(lists=['venues'])
+    click.echo('Refreshed {} venues and {} artists.'.format(venues_, artists_))
+
+@fyyur_cli.command('build-assets')
+@click.option('--no-compress', is_flag=True, help='Skip the .gz/.br variants.')
+def build_assets(no_compress):
+    '''Fingerprint static files and build the layout bundles into static/dist.'''
+    manifest = assets.build(current_app.static_folder, precompress=not no_compress)
+    static_assets.load()
+    click.echo('Built {} assets into {}.'.format(len(manifest), static_assets.dist))
+
+@fyyur_cli.command('geocode')
+@click.option('--all', 'everything', is_flag=True, help='Relocate every venue, not just unlocated ones.')
+def geocode_venues(everything):
+    '''Locate venues from the bundled gazetteer (no network access).'''
+    places = db.session.query(Venue.city, Venue.state).distinct()
+    if not everything:
+        places = places.filter(Venue.geohash.is_(None))
+    located, unknown = 0, []
+    for city, state in places.all():
+        values = geo.location(city, state)
+        if values['geohash'] is None:
+            unknown.append('{}, {}'.format(city, state))
+            if not everything:
+                continue
+        query = Venue.query.filter(Venue.city == city, Venue.state == state)
+        if not everything:
+            query = query.filter(Venue.geohash.is_(None))
+        count = query.update(values, synchronize_session=False)
+        if values['geohash'] is not None:
+            located += count
+    db.session.commit()
+    click.echo('Located {} venues.'.format(located))
+    if unknown:
+        click.echo('Not in the gazetteer: {}'.format('; '.join(sorted(unknown))))
+
+@fyyur_cli.command('sync-replicas')
+def sync_replicas():
+    '''Copy a SQLite primary over its SQLite replicas (development only).'''
+    # Local stand-in for replication; real replicas follow the primary by themselves.
+    engines = [db.get_engine(current_app, bind) for bind in replica_routing.binds]
+    if not engines:
+        raise click.ClickException('No replicas configured; set DATABASE_REPLICA_URLS.')
+    if any(engine.dialect.name != 'sqlite' for engine in [db.engine] + engines):
+        raise click.ClickException('sync-replicas only copies SQLite databases.')
+    source = db.engine.raw_connection()
+    try:
+        for engine in engines:
+            target = engine.raw_connection()
+            try:
+                source.connection.backup(target.connection)
+            finally:
+                target.close()
+    finally:
+        source.close()
+    click.echo('Copied the primary to {} replicas.'.format(len(engines)))
+
+def genre_ids_by_name(names):
+    names = set(names)
+    if not names:
+        return {}
+    ids = dict(db.session.query(Genre.name, Genre.id).filter(Genre.name.in_(names)))
+    missing = [{'name': name} for name in names if name not in ids]
+    if missing:
+        db.session.execute(Genre.__table__.insert(), missing)
+        ids.update(db.session.query(Genre.name, Genre.id).filter(
+            Genre.name.in_([row['name'] for row in missing])))
+    return ids
+
+def import_entity_batch(kind, records):
+    # Upserts on the natural key (name, city, state): one SELECT finds the
+    # existing rows, then inserts and updates go out as executemany batches.
+    # Updates only write the columns the input has; inserts leave the
+    # missing ones empty.
+    model, link, link_key = {
+        'venues': (Venue, venue_genres, 'venue_id'),
+        'artists': (Artist, artist_genres, 'artist_id'),
+    }[kind]
+    table = model.__table__
+    columns = [field for field in bulk.FIELDS[kind] if field not in ('id', 'genres')]
+    # A blank city or state is part of the key as '': NULL = NULL is never
+    # true in SQL, so such rows would never match and be added again.
+    city = db.func.coalesce(model.city, '')
+    state = db.func.coalesce(model.state, '')
+    natural_key = db.tuple_(model.name, city, state)
+
+    batch = {}
+    for record in records:
+        if isinstance(record.get('name'), str) and record['name']:
+            batch[(record['name'], record.get('city') or '', record.get('state') or '')] = record
+    rejected = len(records) - len(batch)
+    if not batch:
+        return 0, 0, rejected
+
+    def ids_for(keys):
+        return {(name, city_, state_): entity_id for entity_id, name, city_, state_ in
+                db.session.query(model.id, model.name, city, state)
+                .filter(natural_key.in_(list(keys)))}
+
+    ids = ids_for(batch)
+    inserts, inserts_with_id, updates = [], [], {}
+    for key, record in batch.items():
+        if key in ids:
+            values = {column: record[column] for column in columns if column in record}
+        else:
+            values = {column: record.get(column) for column in columns}
+        for column in ('seeking_talent', 'seeking_venue'):
+            if column in values and values[column] is None:
+                values[column] = False
+        if kind == 'venues':
+            # key holds the row's city and state, given or not.
+            values.update(geo.location(key[1] or None, key[2] or None))
+        if key in ids:
+            values['b_id'] = ids[key]
+            # One executemany per set of columns; rows of an NDJSON file
+            # need not all carry the same keys.
+            updates.setdefault(frozenset(values), []).append(values)
+        elif record.get('id') is not None:
+            values['id'] = record['id']
+            inserts_with_id.append(values)
+        else:
+            inserts.append(values)
+    for rows in (inserts, inserts_with_id):
+        if rows:
+            db.session.execute(table.insert(), rows)
+    for rows in updates.values():
+        db.session.execute(table.update().where(table.c.id == db.bindparam('b_id')), rows)
+    if inserts or inserts_with_id:
+        ids.update(ids_for(key for key in batch if key not in ids))
+
+    genres = {ids[key]: record['genres'] for key, record in batch.items() if record.get('genres') is not None}
+    if genres:
+        genre_ids = genre_ids_by_name(name for names in genres.values() for name in names)
+        db.session.execute(link.delete().where(link.c[link_key].in_(list(genres))))
+        links = [{link_key: owner_id, 'genre_id': genre_ids[name]}
+                 for owner_id, names in genres.items() for name in set(names)]
+        if links:
+            db.session.execute(link.insert(), links)
+    return len(inserts) + len(inserts_with_id), sum(map(len, updates.values())), rejected
+
+def import_show_batch(records):
+    # Rows pointing at unknown venues/artists, with a bad time range, or
+    # overlapping another show of the venue or artist are rejected; shows
+    # already present under (venue_id, artist_id, start_time) are skipped.
+    # A missing end_time means the default show length.
+    venue_ids = {record.get('venue_id') for record in records}
+    artist_ids = {record.get('artist_id') for record in records}
+    known_venues = {ven_id for ven_id, in db.session.query(Venue.id).filter(Venue.id.in_(venue_ids))}
+    known_artists = {art_id for art_id, in db.session.query(Artist.id).filter(Artist.id.in_(artist_ids))}
+    batch = {}
+    for record in records:
+        if record.get('venue_id') in known_venues and record.get('artist_id') in known_artists \
+                and record.get('start_time') is not None:
+            batch[(record['venue_id'], record['artist_id'], record['start_time'])] = record
+    rejected = len(records) - len(batch)
+    if batch:
+        existing = set(db.session.query(Show.venue_id, Show.artist_id, Show.start_time).filter(
+            db.tuple_(Show.venue_id, Show.artist_id, Show.start_time).in_(list(batch))))
+        rows = [{'venue_id': ven_id, 'artist_id': art_id, 'start_time': start_time,
+                 'end_time': record.get('end_time') or start_time + DEFAULT_SHOW_DURATION}
+                for (ven_id, art_id, start_time), record in batch.items()
+                if (ven_id, art_id, start_time) not in existing]
+    else:
+        rows = []
+    valid = [row for row in rows
+             if timedelta(0) < row['end_time'] - row['start_time'] <= MAX_SHOW_DURATION]
+    conflicting = {id(booking) for booking, _ in booking_conflicts(valid)}
+    rejected += len(rows) - len(valid) + len(conflicting)
+    rows = [row for row in valid if id(row) not in conflicting]
+    if rows:
+        db.session.execute(Show.__table__.insert(), rows)
+        now = datetime.now()
+        refresh_show_counters(Venue, Show.venue_id, now, list({row['venue_id'] for row in rows}))
+        refresh_show_counters(Artist, Show.artist_id, now, list({row['artist_id'] for row in rows}))
+    return len(rows), 0, rejected
+
+def export_records(kind, batch_size):
+    # Walks the table in id order one batch at a time so memory stays flat.
+    model = {'venues': Venue, 'artists': Artist, 'shows': Show}[kind]
+    fields = [field for field in bulk.FIELDS[kind] if field != 'genres']
+    query = model.query.order_by(model.id)
+    if kind != 'shows':
+        query = query.options(db.selectinload(model.genres))
+    last_id = 0
+    while True:
+        rows = query.filter(model.id > last_id).limit(batch_size).all()
+        if not rows:
+            return
+        for row in rows:
+            record = {field: getattr(row, field) for field in fields}
+            if kind != 'shows':
+                record['genres'] = [genre.name for genre in row.genres]
+            yield record
+        last_id = rows[-1].id
+        db.session.expunge_all()
+
+def import_rows(import_batch, records):
+    # A row breaking a constraint (say an explicit id taken by another
+    # row) fails the whole batch; the batch is then imported again one row
+    # at a time, so only the rows that break one are rejected.
+    try:
+        with db.session.begin_nested():
+            return list(import_batch(records))
+    except IntegrityError:
+        pass
+    totals = [0, 0, 0]
+    for record in records:
+        try:
+            with db.session.begin_nested():
+                counts = import_batch([record])
+        except IntegrityError:
+            counts = (0, 0, 1)
+        totals = [total + count for total, count in zip(totals, counts)]
+    return totals
+
+@fyyur_cli.command('import')
+@click.argument('kind', type=click.Choice(['venues', 'artists', 'shows']))
+@click.argument('source', type=click.File('r'))
+@click.option('--format', 'fmt', type=click.Choice(['csv', 'ndjson']),
+              help='Defaults to ndjson for .ndjson/.jsonl files, csv otherwise.')
+@click.option('--batch-size', default=1000, show_default=True)
+def import_command(kind, source, fmt, batch_size):
+    '''Upsert venues, artists or shows from a CSV/NDJSON file ("-" for stdin).'''
+    fmt = bulk.format_for(source.name, fmt)
+    import_batch = import_show_batch if kind == 'shows' else \
+        lambda records: import_entity_batch(kind, records)
+    progress = bulk.Throughput()
+    totals = [0, 0, 0]
+    try:
+        for batch in bulk.chunked(bulk.read_records(source, fmt, kind), batch_size):
+            records = [record for record in batch if record is not None]
+            counts = import_rows(import_batch, records)
+            counts[2] += len(batch) - len(records)
+            db.session.commit()
+            totals = [total + count for total, count in zip(totals, counts)]
+            progress.add(len(batch))
+            click.echo('{} rows read ({:.0f} rows/s)'.format(progress.rows, progress.rate), err=True)
+    except (ValueError, KeyError) as e:
+        db.session.rollback()
+        raise click.ClickException('Bad input after {} rows: {}'.format(progress.rows, e))
+    if kind != 'shows' and db.engine.dialect.name == 'postgresql':
+        # Explicit ids from an export do not advance the id sequence.
+        db.session.execute(db.text(
+            "SELECT setval(pg_get_serial_sequence('{0}', 'id'), coalesce(max(id), 1)) FROM {0}".format(kind)))
+        db.session.commit()
+    page_cache.invalidate(lists=['venues', 'artists', 'shows'])
+    click.echo('Imported {}: {} inserted, {} updated, {} rejected ({:.0f} rows/s).'.format(
+        kind, totals[0], totals[1], totals[2], progress.rate))
+
+@fyyur_cli.command('export')
+@click.argument('kind', type=click.Choice(['venues', 'artists', 'shows']))
+@click.argument('target', type=click.File('w'))
+@click.option('--format', 'fmt', type=click.Choice(['csv', 'ndjson']),
+              help='Defaults to ndjson for .ndjson/.jsonl files, csv otherwise.')
+@click.option('--batch-size', default=1000, show_default=True)
+def export_command(kind, target, fmt, batch_size):
+    '''Write venues, artists or shows to a CSV/NDJSON file ("-" for stdout).'''
+    progress = bulk.Throughput()
+    progress.add(bulk.write_records(target, bulk.format_for(target.name, fmt), kind,
+                                    export_records(kind, batch_size)))
+    click.echo('Exported {} {} ({:.0f} rows/s).'.format(progress.rows, kind, progress.rate), err=True)
+
 def not_found_error(error):
         return render_template('errors/404.html'), 404
 
-@app.errorhandler(500)
 def server_error(error):
         return render_template('errors/500.html'), 500
 
+#----------------------------------------------------------------------------#
+# App Factory.
+#----------------------------------------------------------------------------#
+
+def create_app(config=None):
+    '''Builds the app for config, a config class or its dotted name.
+
+    Defaults to FYYUR_CONFIG, else DevelopmentConfig; wsgi.py selects
+    production. `flask` finds this factory through FLASK_APP=app.
+    '''
+    app = Flask(__name__)
+    app.config.from_object(config or os.environ.get('FYYUR_CONFIG', 'config.DevelopmentConfig'))
+    moment.init_app(app)
+    # Adds the replica binds, so it goes before the database.
+    replica_routing.init_app(app)
+    db.init_app(app)
+    # Registered first so its after_request hook runs last, on the final body.
+    compress.init_app(app)
+    page_cache.init_app(app)
+    jobs.init_app(app)
+    sql_instrumentation.init_app(app)
+    static_assets.init_app(app)
+    app.after_request(conditional_html)
+    # Lookups loaded from the app's database; each app has its own, as its
+    # page cache generations are its own.
+    app.extensions['fyyur'] = {
+        # Table name -> (list cache key, load time, picker choices).
+        'pickers': {},
+        # Table name -> typeahead index of names, loaded on first use.
+        'name_indexes': {'venues': suggest.PrefixIndex(), 'artists': suggest.PrefixIndex()},
+    }
+
+    # Compiled templates are kept on disk, so new workers skip the Jinja compile.
+    if app.config['JINJA_BYTECODE_CACHE_DIR']:
+        os.makedirs(app.config['JINJA_BYTECODE_CACHE_DIR'], exist_ok=True)
+        app.jinja_env.bytecode_cache = FileSystemBytecodeCache(app.config['JINJA_BYTECODE_CACHE_DIR'])
+    app.jinja_env.filters['datetime'] = format_datetime
+
+    app.add_url_rule('/', 'index', index)
+    app.add_url_rule('/cache/stats', 'cache_stats', cache_stats)
+    for blueprint in (venue_pages, artist_pages, show_pages, api):
+        app.register_blueprint(blueprint)
+    app.register_error_handler(404, not_found_error)
+    app.register_error_handler(500, server_error)
+    app.cli.add_command(fyyur_cli)
+    # Flask-Migrate pulls in Alembic, the slowest import in the app. The
+    # flask command has already loaded it for its `db` plugin commands;
+    # servers never need it.
+    if 'flask_migrate' in sys.modules:
+        from flask_migrate import Migrate
+        Migrate(app, db)
 
-if not app.debug:
+    if not app.debug:
         file_handler = FileHandler('error.log')
         file_handler.setFormatter(
                 Formatter('%(asctime)s %(levelname)s: %(message)s [in %(pathname)s:%(lineno)d]')
@@ -488,6 +1685,7 @@ if not app.debug:
         file_handler.setLevel(logging.INFO)
         app.logger.addHandler(file_handler)
         app.logger.info('errors')
+    return app
 
 #----------------------------------------------------------------------------#
 # Launch.
@@ -495,11 +1693,11 @@ if not app.debug:
 
 # Default port:
 if __name__ == '__main__':
-        app.run()
+        create_app().run()
 
 # Or specify port manually:
 '''
 if __name__ == '__main__':
         port = int(os.environ.get('PORT', 5000))
-        app.run(host='0.0.0.0', port=port)
+        create_app().run(host='0.0.0.0', port=port)
 '''
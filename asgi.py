@@ -0,0 +1,231 @@
+'''Async serving entry point.
+
+    uvicorn asgi:application --workers 2
+
+Detail and search pages load their data with async SQLAlchemy sessions
+(asyncpg on PostgreSQL, aiosqlite on SQLite) so a slow query holds no
+thread, and the independent queries of one page run concurrently. The
+result is handed to the normal Flask view, so templates, caching and
+response shapes are the same as under wsgi.py. Every other route is
+served by the WSGI app through asgiref's WsgiToAsgi adapter.
+'''
+import asyncio
+import io
+import sys
+
+from asgiref.wsgi import WsgiToAsgi
+from flask import g, request, session
+from sqlalchemy import func, select
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import configure_mappers, joinedload, selectinload
+from werkzeug.exceptions import HTTPException
+
+from app import (page_cache, replica_routing, Venue, Artist, Show, entity_detail, entity_summary,
+                 name_matches, page_args, request_now, search_results, show_summary)
+# Selects ProductionConfig, checks SECRET_KEY and builds the app.
+from wsgi import application as app
+
+ASYNC_DRIVERS = {
+    'postgresql': 'postgresql+asyncpg',
+    'sqlite': 'sqlite+aiosqlite',
+}
+
+
+def async_engine(uri, config):
+    url = make_url(uri)
+    url = url.set(drivername=ASYNC_DRIVERS.get(url.get_backend_name(), url.drivername))
+    return create_async_engine(url, **config.get('SQLALCHEMY_ENGINE_OPTIONS', {}))
+
+
+# Bind name -> engine: None is the primary, "replica0"... the replicas that
+# replica_routing spreads reads over (their URLs are in SQLALCHEMY_BINDS).
+engines = {None: async_engine(app.config['SQLALCHEMY_DATABASE_URI'], app.config)}
+with app.app_context():
+    for bind in replica_routing.binds:
+        engines[bind] = async_engine(app.config['SQLALCHEMY_BINDS'][bind], app.config)
+
+# Show.venue and Show.artist are backrefs, which only exist once the
+# mappers are configured; the sync app does that on its first query.
+configure_mappers()
+
+#----------------------------------------------------------------------------#
+# Queries.
+#----------------------------------------------------------------------------#
+
+# Each coroutine uses its own session, and so its own connection; one
+# connection cannot run two statements at once. They read from the
+# database replica_routing picked for the request, as the sync views do.
+
+def read_engine():
+    return engines[g.get('db_bind')]
+
+async def load_entity(model, entity_id):
+    async with AsyncSession(read_engine()) as session:
+        return await session.get(model, entity_id, options=[selectinload(model.genres)])
+
+async def load_shows(column, entity_id, criterion):
+    query = select(Show).options(joinedload(Show.venue), joinedload(Show.artist)) \
+        .where(column == entity_id, criterion).order_by(Show.start_time)
+    async with AsyncSession(read_engine()) as session:
+        return [show_summary(show) for show in (await session.execute(query)).scalars()]
+
+async def detail_data(model, column, entity_id):
+    now = request_now()
+    entity, past_shows, upcoming_shows = await asyncio.gather(
+        load_entity(model, entity_id),
+        load_shows(column, entity_id, Show.start_time <= now),
+        load_shows(column, entity_id, Show.start_time > now))
+    # A missing entity is left to the view, which answers with its 404.
+    return entity_detail(entity, past_shows, upcoming_shows) if entity else None
+
+async def count_matches(model, search_term):
+    async with AsyncSession(read_engine()) as session:
+        return await session.scalar(
+            select(func.count()).select_from(model).where(name_matches(model, search_term)))
+
+async def load_matches(model, search_term, offset, limit):
+    query = select(model).where(name_matches(model, search_term)) \
+        .order_by(model.id).offset(offset).limit(limit)
+    async with AsyncSession(read_engine()) as session:
+        return (await session.execute(query)).scalars().all()
+
+async def search_data(model):
+    offset, limit = page_args()
+    search_term = request.values.get('search_term', '')
+    count, rows = await asyncio.gather(
+        count_matches(model, search_term),
+        load_matches(model, search_term, offset, limit))
+    return search_results(count, [entity_summary(row) for row in rows], offset, limit)
+
+# Endpoint -> coroutine building the view model from the URL arguments.
+PREFETCH = {
+    'venues.show_venue': lambda args: detail_data(Venue, Show.venue_id, args['venue_id']),
+    'artists.show_artist': lambda args: detail_data(Artist, Show.artist_id, args['artist_id']),
+    'api.api_show_venue': lambda args: detail_data(Venue, Show.venue_id, args['venue_id']),
+    'api.api_show_artist': lambda args: detail_data(Artist, Show.artist_id, args['artist_id']),
+    'venues.search_venues': lambda args: search_data(Venue),
+    'artists.search_artists': lambda args: search_data(Artist),
+    'api.api_search_venues': lambda args: search_data(Venue),
+    'api.api_search_artists': lambda args: search_data(Artist),
+}
+
+#----------------------------------------------------------------------------#
+# Adapter.
+#----------------------------------------------------------------------------#
+
+def wsgi_environ(scope, body):
+    '''Builds the WSGI environ Flask expects from an ASGI HTTP scope.'''
+    server_name, server_port = scope.get('server') or ('localhost', 80)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode('utf-8').decode('latin-1'),
+        'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+        'QUERY_STRING': scope['query_string'].decode('latin-1'),
+        'SERVER_NAME': server_name,
+        'SERVER_PORT': str(server_port),
+        'SERVER_PROTOCOL': 'HTTP/' + scope['http_version'],
+        'REMOTE_ADDR': scope['client'][0] if scope.get('client') else '',
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    for name, value in scope['headers']:
+        name = name.decode('latin-1').upper().replace('-', '_')
+        if name not in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+            name = 'HTTP_' + name
+        value = value.decode('latin-1')
+        environ[name] = environ[name] + ',' + value if name in environ else value
+    return environ
+
+
+class FyyurASGI(object):
+    '''ASGI application serving PREFETCH endpoints natively and the rest over WSGI.'''
+
+    def __init__(self, app, engines):
+        self.app = app
+        self.engines = engines
+        self.wsgi = WsgiToAsgi(app)
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            return await self.lifespan(receive, send)
+        endpoint, view_args = self.match(scope) if scope['type'] == 'http' else (None, None)
+        if endpoint not in PREFETCH:
+            return await self.wsgi(scope, receive, send)
+        body = await self.read_body(receive)
+        with self.app.request_context(wsgi_environ(scope, body)):
+            try:
+                replica_routing.route()
+                key = self.cache_key(endpoint, view_args)
+                if key is None or page_cache.backend.get(key) is None:
+                    if key is not None:
+                        # Going into the shared cache: read from the primary,
+                        # as cached_page renders its misses.
+                        replica_routing.use_primary()
+                    prefetched = await PREFETCH[endpoint](view_args)
+                    if prefetched is not None:
+                        g.prefetched = prefetched
+                response = self.app.full_dispatch_request()
+            except Exception as e:
+                response = self.app.handle_exception(e)
+            await self.send_response(response, scope['method'] != 'HEAD', send)
+
+    def match(self, scope):
+        adapter = self.app.url_map.bind('localhost', script_name=scope.get('root_path') or None,
+                                        url_scheme=scope.get('scheme', 'http'))
+        try:
+            return adapter.match(scope['path'], method=scope['method'])
+        except HTTPException:
+            return None, None
+
+    def cache_key(self, endpoint, view_args):
+        # Mirrors cached_page: the key the page is served from or stored
+        # under, or None when the request bypasses the cache. A cache hit
+        # needs no data at all.
+        key_func = getattr(self.app.view_functions[endpoint], 'cache_key', None)
+        if key_func is None or not self.app.config['CACHE_ENABLED'] or session.get('_flashes') \
+                or replica_routing.reads_primary():
+            return None
+        return key_func(**view_args)
+
+    async def read_body(self, receive):
+        body = []
+        while True:
+            message = await receive()
+            body.append(message.get('body', b''))
+            if not message.get('more_body'):
+                return b''.join(body)
+
+    async def send_response(self, response, include_body, send):
+        try:
+            await send({
+                'type': 'http.response.start',
+                'status': response.status_code,
+                'headers': [(name.lower().encode('latin-1'), value.encode('latin-1'))
+                            for name, value in response.headers.to_wsgi_list()],
+            })
+            if include_body:
+                for chunk in response.iter_encoded():
+                    await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+            await send({'type': 'http.response.body', 'body': b''})
+        finally:
+            response.close()
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                for engine in self.engines.values():
+                    await engine.dispose()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+
+application = FyyurASGI(app, engines)
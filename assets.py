@@ -0,0 +1,182 @@
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import posixpath
+import re
+
+from flask import current_app, request, send_from_directory, url_for
+
+# Layout bundles: logical name -> source files under static/, in load order.
+BUNDLES = {
+    'css/layout.css': [
+        'css/bootstrap.min.css',
+        'css/layout.main.css',
+        'css/main.css',
+        'css/main.responsive.css',
+        'css/main.quickfix.css',
+    ],
+    'js/head.js': [
+        'js/libs/modernizr-2.8.2.min.js',
+        'js/libs/moment.min.js',
+    ],
+    # Deferred, after jQuery.
+    'js/main.js': [
+        'js/script.js',
+        'js/libs/bootstrap-3.1.1.min.js',
+        'js/plugins.js',
+    ],
+}
+
+DIST = 'dist'
+MANIFEST = 'manifest.json'
+# Binary formats are already compressed; only these get .gz/.br variants.
+COMPRESSIBLE = ('.css', '.js', '.map', '.svg', '.json', '.txt', '.ttf', '.otf', '.eot')
+IMMUTABLE = 'public, max-age=31536000, immutable'
+
+_css_urls = re.compile(r'''url\(\s*(['"]?)([^'")]+)\1\s*\)''')
+_url_parts = re.compile(r'([^?#]*)(.*)$')
+
+
+def fingerprint(path, content):
+    stem, ext = posixpath.splitext(path)
+    return '{}.{}{}'.format(stem, hashlib.md5(content).hexdigest()[:12], ext)
+
+
+def rewrite_css(content, source, target, manifest):
+    '''Points relative url()s in source's CSS at their fingerprinted files,
+    relative to target, where the CSS will be written.'''
+    def replace(match):
+        quote, url = match.groups()
+        if url.startswith(('/', 'data:', 'http:', 'https:', '#')):
+            return match.group(0)
+        path, suffix = _url_parts.match(url).groups()
+        resolved = posixpath.normpath(posixpath.join(posixpath.dirname(source), path))
+        resolved = manifest.get(resolved, resolved)
+        new = posixpath.relpath(resolved, posixpath.dirname(target)) + suffix
+        return 'url({0}{1}{0})'.format(quote, new)
+    return _css_urls.sub(replace, content.decode('utf-8')).encode('utf-8')
+
+
+def _write(dist, path, content, precompress):
+    filename = os.path.join(dist, path)
+    os.makedirs(os.path.dirname(filename), exist_ok=True)
+    with open(filename, 'wb') as f:
+        f.write(content)
+    if precompress and path.endswith(COMPRESSIBLE):
+        with open(filename + '.gz', 'wb') as f:
+            f.write(gzip.compress(content, 9))
+        try:
+            import brotli
+        except ImportError:
+            return
+        with open(filename + '.br', 'wb') as f:
+            f.write(brotli.compress(content))
+
+
+def build(static_folder, precompress=True):
+    '''Writes fingerprinted copies of every static file and the bundles to
+    static/dist, with .gz (and .br, if brotli is installed) variants, and
+    returns the manifest of logical name -> fingerprinted name.
+
+    Old builds are left in place so pages rendered before a deploy can
+    still load their assets.
+    '''
+    dist = os.path.join(static_folder, DIST)
+    sources = {}
+    for root, dirs, files in os.walk(static_folder):
+        dirs[:] = [d for d in dirs if os.path.join(root, d) != dist]
+        for name in files:
+            filename = os.path.join(root, name)
+            with open(filename, 'rb') as f:
+                sources[os.path.relpath(filename, static_folder).replace(os.sep, '/')] = f.read()
+
+    manifest = {}
+    # Everything CSS can point at first, so stylesheets can be rewritten.
+    for path in sorted(sources, key=lambda path: path.endswith('.css')):
+        content = sources[path]
+        if path.endswith('.css'):
+            content = rewrite_css(content, path, path, manifest)
+        manifest[path] = fingerprint(path, content)
+        _write(dist, manifest[path], content, precompress)
+
+    for name, paths in BUNDLES.items():
+        if name.endswith('.css'):
+            content = b'\n'.join(rewrite_css(sources[path], path, name, manifest) for path in paths)
+        else:
+            # Minified files may end without a newline or semicolon.
+            content = b'\n;'.join(sources[path] for path in paths)
+        manifest[name] = fingerprint(name, content)
+        _write(dist, manifest[name], content, precompress)
+
+    with open(os.path.join(dist, MANIFEST), 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    return manifest
+
+
+class Assets(object):
+    '''Template helpers and serving for the built assets.
+
+    asset_url('img/x.jpg') and asset_urls('css/layout.css') return the
+    fingerprinted URLs once `flask fyyur build-assets` has run, and the
+    plain static files (every file of a bundle) until then. Fingerprinted
+    files are served from /static/dist with an immutable Cache-Control,
+    picking the .br or .gz variant the client accepts.
+    '''
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        # The dist folder and manifest belong to the app, not this object.
+        app.extensions['assets'] = {'dist': os.path.join(app.static_folder, DIST), 'manifest': {}}
+        self.load(app)
+        app.add_url_rule(app.static_url_path + '/' + DIST + '/<path:filename>', 'assets', self.serve)
+        app.add_template_global(self.asset_url)
+        app.add_template_global(self.asset_urls)
+
+    @property
+    def dist(self):
+        return current_app.extensions['assets']['dist']
+
+    @property
+    def manifest(self):
+        return current_app.extensions['assets']['manifest']
+
+    def load(self, app=None):
+        state = (app or current_app).extensions['assets']
+        try:
+            with open(os.path.join(state['dist'], MANIFEST)) as f:
+                state['manifest'] = json.load(f)
+        except FileNotFoundError:
+            state['manifest'] = {}
+
+    def asset_url(self, filename):
+        manifest = self.manifest
+        if filename in manifest:
+            return url_for('assets', filename=manifest[filename])
+        return url_for('static', filename=filename)
+
+    def asset_urls(self, bundle):
+        manifest = self.manifest
+        if bundle in manifest:
+            return [url_for('assets', filename=manifest[bundle])]
+        return [url_for('static', filename=path) for path in BUNDLES[bundle]]
+
+    def serve(self, filename):
+        dist = self.dist
+        accepted = request.accept_encodings
+        for encoding, suffix in (('br', '.br'), ('gzip', '.gz')):
+            if accepted[encoding] and os.path.isfile(os.path.join(dist, filename + suffix)):
+                response = send_from_directory(dist, filename + suffix, max_age=31536000,
+                                               mimetype=mimetypes.guess_type(filename)[0])
+                response.headers['Content-Encoding'] = encoding
+                break
+        else:
+            response = send_from_directory(dist, filename, max_age=31536000)
+        response.headers['Cache-Control'] = IMMUTABLE
+        response.vary.add('Accept-Encoding')
+        return response
+
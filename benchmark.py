@@ -0,0 +1,545 @@
+'''Route benchmark for Fyyur.
+
+Seeds a synthetic catalog at a chosen scale, then drives every route in
+app.py through the Flask test client and reports latency percentiles,
+queries per request (from the Server-Timing header) and peak RSS.
+Results are written as JSON so runs from different commits can be
+diffed with --compare.
+
+    python benchmark.py --shows 1000 --database sqlite:///bench.db
+    python benchmark.py --shows 100000 --skip-seed --compare before.json
+    python benchmark.py --dates 100000
+    python benchmark.py --skip-seed --workers 1,2,4 --concurrency 32
+    python benchmark.py --startup 10
+'''
+import argparse
+import json
+import os
+import platform
+import random
+import re
+import resource
+import shlex
+import socket
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+import geo
+
+CITIES = [
+    ('San Francisco', 'CA'), ('Los Angeles', 'CA'), ('New York', 'NY'), ('Brooklyn', 'NY'),
+    ('Austin', 'TX'), ('Houston', 'TX'), ('Seattle', 'WA'), ('Portland', 'OR'),
+    ('Chicago', 'IL'), ('Nashville', 'TN'), ('New Orleans', 'LA'), ('Denver', 'CO'),
+]
+GENRES = ['Alternative', 'Blues', 'Classical', 'Country', 'Electronic', 'Folk', 'Funk',
+          'Hip-Hop', 'Heavy Metal', 'Instrumental', 'Jazz', 'Musical Theatre', 'Pop',
+          'Punk', 'R&B', 'Reggae', 'Rock n Roll', 'Soul', 'Other']
+WORDS = ['Blue', 'Red', 'Golden', 'Velvet', 'Electric', 'Silent', 'Wild', 'Lucky', 'Iron',
+         'Neon', 'Hollow', 'Crystal', 'Midnight', 'Echo', 'Cosmic', 'Rusty']
+NOUNS = ['Room', 'Hall', 'Lounge', 'Cellar', 'Garden', 'Club', 'Barn', 'Theatre',
+         'Owls', 'Wolves', 'Tides', 'Engines', 'Saints', 'Ghosts', 'Rivers', 'Sparks']
+
+# Command used by --workers; {port} and {workers} are filled in per run.
+DEFAULT_SERVER = 'gunicorn -c gunicorn.conf.py --bind 127.0.0.1:{port} --workers {workers} wsgi:application'
+
+SERVER_TIMING_QUERIES = re.compile(r'db;[^,]*desc="(\d+) queries"')
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = max(int(round(pct / 100.0 * len(ordered) + 0.5)) - 1, 0)
+    return ordered[min(index, len(ordered) - 1)]
+
+
+def peak_rss_kb():
+    usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and kilobytes elsewhere.
+    return usage // 1024 if sys.platform == 'darwin' else usage
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'],
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def chunks(total, size):
+    for start in range(0, total, size):
+        yield start, min(start + size, total)
+
+
+def seed(fyyur, shows, rng, batch_size=10000):
+    '''Creates venues, artists and shows in proportion to the show count.'''
+    db = fyyur.db
+    venues = max(10, shows // 50)
+    artists = max(10, shows // 20)
+    db.drop_all()
+    db.create_all()
+    db.session.execute(fyyur.Genre.__table__.insert(), [{'name': name} for name in GENRES])
+    genre_ids = list(range(1, len(GENRES) + 1))
+
+    def entity(i, kind):
+        city, state = rng.choice(CITIES)
+        row = {
+            'id': i,
+            'name': '{} {} {}'.format(rng.choice(WORDS), rng.choice(NOUNS), i),
+            'city': city,
+            'state': state,
+            'phone': '555-{:03d}-{:04d}'.format(rng.randrange(1000), rng.randrange(10000)),
+            'image_link': 'https://example.com/{}/{}.jpg'.format(kind, i),
+            'facebook_link': 'https://www.facebook.com/{}{}'.format(kind, i),
+            'website': 'https://example.com/{}/{}'.format(kind, i),
+            'seeking_description': None,
+        }
+        if kind == 'venues':
+            row.update(address='{} Main St'.format(i), seeking_talent=False)
+            # Scattered around the city centre, so nearby searches have
+            # distances to sort rather than one point per city.
+            lat, lng = geo.geocode(city, state)
+            lat, lng = lat + rng.uniform(-0.2, 0.2), lng + rng.uniform(-0.2, 0.2)
+            row.update(latitude=lat, longitude=lng, geohash=geo.encode(lat, lng))
+        else:
+            row.update(seeking_venue=False)
+        return row
+
+    for model, link, key, count in ((fyyur.Venue, fyyur.venue_genres, 'venue_id', venues),
+                                    (fyyur.Artist, fyyur.artist_genres, 'artist_id', artists)):
+        for start, stop in chunks(count, batch_size):
+            ids = range(start + 1, stop + 1)
+            db.session.execute(model.__table__.insert(),
+                               [entity(i, model.__tablename__) for i in ids])
+            db.session.execute(link.insert(), [
+                {key: i, 'genre_id': genre_id}
+                for i in ids for genre_id in rng.sample(genre_ids, rng.randint(1, 3))])
+        db.session.commit()
+
+    # Shows spread over a year either side of today without double booking
+    # anyone (PostgreSQL rejects that): venue v's k-th show is in the k-th
+    # time slot, at an offset of its own, and goes to artist (v + k) mod
+    # artists, so an artist never has two shows in one slot.
+    now = datetime.now()
+    slots = -(-shows // venues)
+    slot_length = timedelta(days=730) / slots
+    durations = [timedelta(minutes=minutes) for minutes in (60, 90, 120, 180)]
+    offsets = [timedelta(seconds=rng.randint(0, int((slot_length - max(durations)).total_seconds()) // 60) * 60)
+               for _ in range(venues)]
+    first = now - timedelta(days=365)
+
+    def show(i):
+        venue, slot = i % venues, i // venues
+        start_time = first + slot * slot_length + offsets[venue]
+        return {'venue_id': venue + 1, 'artist_id': (venue + slot) % artists + 1,
+                'start_time': start_time, 'end_time': start_time + rng.choice(durations)}
+
+    for start, stop in chunks(shows, batch_size):
+        db.session.execute(fyyur.Show.__table__.insert(), [show(i) for i in range(start, stop)])
+        db.session.commit()
+
+    now = datetime.now()
+    fyyur.refresh_show_counters(fyyur.Venue, fyyur.Show.venue_id, now, everything=True)
+    fyyur.refresh_show_counters(fyyur.Artist, fyyur.Show.artist_id, now, everything=True)
+    db.session.commit()
+    return {'venues': venues, 'artists': artists, 'shows': shows}
+
+
+def routes(fyyur, app, rng):
+    '''(name, method, url, body) for every route, reads before writes.'''
+    with app.app_context():
+        venue_ids = [row.id for row in fyyur.Venue.query.with_entities(fyyur.Venue.id).limit(1000)]
+        artist_ids = [row.id for row in fyyur.Artist.query.with_entities(fyyur.Artist.id).limit(1000)]
+        venue = fyyur.Venue.query.filter_by(id=venue_ids[0]).one()
+        term = venue.name.split()[0].lower()
+    venue_form = {'name': 'Bench Venue', 'city': 'Austin', 'state': 'TX', 'address': '1 Bench St',
+                  'phone': '555-000-0000', 'image_link': 'https://example.com/v.jpg',
+                  'genres': ['Jazz', 'Blues'], 'facebook_link': 'https://www.facebook.com/v',
+                  'website_link': 'https://example.com/v', 'seeking_description': ''}
+    artist_form = {'name': 'Bench Artist', 'city': 'Austin', 'state': 'TX', 'phone': '555-000-0000',
+                   'image_link': 'https://example.com/a.jpg', 'genres': ['Jazz'],
+                   'facebook_link': 'https://www.facebook.com/a', 'website': 'https://example.com/a',
+                   'seeking_description': ''}
+
+    def show_form():
+        start_time = datetime.now() + timedelta(days=rng.randint(1, 365))
+        return {'venue_id': str(rng.choice(venue_ids)), 'artist_id': str(rng.choice(artist_ids)),
+                'start_time': start_time.strftime('%Y-%m-%d %H:%M:%S'), 'duration': '120'}
+
+    def tour():
+        # One artist, a week of nightly shows at different venues.
+        first = datetime.now() + timedelta(days=rng.randint(1, 365))
+        return json.dumps({'artist_id': rng.choice(artist_ids), 'duration': 120, 'partial': True, 'shows': [
+            {'venue_id': venue_id, 'start_time': (first + timedelta(days=night)).strftime('%Y-%m-%d %H:%M:%S')}
+            for night, venue_id in enumerate(rng.sample(venue_ids, min(7, len(venue_ids))))]})
+
+    venue_url = lambda: '/venues/{}'.format(rng.choice(venue_ids))
+    artist_url = lambda: '/artists/{}'.format(rng.choice(artist_ids))
+    return [
+        ('index', 'get', lambda: '/', None),
+        ('venues', 'get', lambda: '/venues', None),
+        ('venues_by_genre', 'get', lambda: '/venues?genre=Jazz', None),
+        ('show_venue', 'get', venue_url, None),
+        ('search_venues', 'post', lambda: '/venues/search', lambda: {'search_term': term}),
+        ('create_venue_form', 'get', lambda: '/venues/create', None),
+        ('edit_venue', 'get', lambda: venue_url() + '/edit', None),
+        ('artists', 'get', lambda: '/artists', None),
+        ('show_artist', 'get', artist_url, None),
+        ('search_artists', 'post', lambda: '/artists/search', lambda: {'search_term': term}),
+        ('create_artist_form', 'get', lambda: '/artists/create', None),
+        ('edit_artist', 'get', lambda: artist_url() + '/edit', None),
+        ('shows', 'get', lambda: '/shows', None),
+        ('create_shows', 'get', lambda: '/shows/create', None),
+        ('api_venues', 'get', lambda: '/api/v1/venues', None),
+        ('api_show_venue', 'get', lambda: '/api/v1' + venue_url(), None),
+        ('api_nearby_venues', 'get', lambda: '/api/v1/venues/nearby?city=Austin&state=TX&upcoming=1', None),
+        ('api_venue_free_slots', 'get', lambda: '/api/v1' + venue_url() + '/free-slots?min_minutes=60', None),
+        ('api_search_venues', 'get', lambda: '/api/v1/venues/search?search_term=' + term, None),
+        ('api_artists', 'get', lambda: '/api/v1/artists', None),
+        ('api_show_artist', 'get', lambda: '/api/v1' + artist_url(), None),
+        ('api_search_artists', 'get', lambda: '/api/v1/artists/search?search_term=' + term, None),
+        ('api_shows', 'get', lambda: '/api/v1/shows', None),
+        ('cache_stats', 'get', lambda: '/cache/stats', None),
+        ('create_venue_submission', 'post', lambda: '/venues/create', lambda: venue_form),
+        ('edit_venue_submission', 'post', lambda: venue_url() + '/edit', lambda: venue_form),
+        ('create_artist_submission', 'post', lambda: '/artists/create', lambda: artist_form),
+        ('edit_artist_submission', 'post', lambda: artist_url() + '/edit', lambda: artist_form),
+        ('create_show_submission', 'post', lambda: '/shows/create', show_form),
+        ('api_book_shows', 'post', lambda: '/api/v1/shows', tour),
+    ]
+
+
+def measure(client, method, url, data):
+    started = time.perf_counter()
+    # Form data as a dict, a JSON body as a string.
+    content_type = 'application/json' if isinstance(data, str) else None
+    response = getattr(client, method)(url, data=data, content_type=content_type)
+    response.get_data()
+    elapsed = (time.perf_counter() - started) * 1000
+    response.close()
+    match = SERVER_TIMING_QUERIES.search(', '.join(response.headers.getlist('Server-Timing')))
+    return elapsed, int(match.group(1)) if match else None, response.status_code
+
+
+def summarize(latencies, queries, statuses):
+    return {
+        'requests': len(latencies),
+        'p50_ms': round(percentile(latencies, 50), 3),
+        'p95_ms': round(percentile(latencies, 95), 3),
+        'p99_ms': round(percentile(latencies, 99), 3),
+        'mean_ms': round(sum(latencies) / len(latencies), 3),
+        'queries_per_request': round(sum(queries) / len(queries), 2) if queries else None,
+        'statuses': sorted(set(statuses)),
+        'peak_rss_kb': peak_rss_kb(),
+    }
+
+
+def run(fyyur, app, requests, rng):
+    client = app.test_client()
+    with app.app_context():
+        last_seeded = fyyur.db.session.query(fyyur.db.func.max(fyyur.Venue.id)).scalar()
+    results = {}
+    for name, method, url, data in routes(fyyur, app, rng):
+        latencies, queries, statuses = [], [], []
+        for _ in range(requests):
+            elapsed, count, status = measure(client, method, url(), data() if data else None)
+            latencies.append(elapsed)
+            statuses.append(status)
+            if count is not None:
+                queries.append(count)
+        results[name] = summarize(latencies, queries, statuses)
+
+    # Delete the venues created above (not the seeded ones the edit
+    # requests renamed), one request each.
+    with app.app_context():
+        created = [row.id for row in fyyur.Venue.query.with_entities(fyyur.Venue.id)
+                   .filter(fyyur.Venue.id > last_seeded)]
+    latencies, queries, statuses = [], [], []
+    for venue_id in created:
+        elapsed, count, status = measure(client, 'delete', '/venues/{}'.format(venue_id), None)
+        latencies.append(elapsed)
+        statuses.append(status)
+        if count is not None:
+            queries.append(count)
+    if latencies:
+        results['delete_venue'] = summarize(latencies, queries, statuses)
+    return results
+
+
+def date_formatting(fyyur, count, rng):
+    '''Per-show cost of rendering a start time, old string path against the filter.'''
+    import babel.dates
+    import dateutil.parser
+    pattern = fyyur.DATETIME_FORMATS['full']
+    now = datetime.now()
+    times = [now + timedelta(minutes=rng.randint(-525600, 525600)) for _ in range(count)]
+
+    def reparse(value):
+        # What the views did before: stringify the column, parse it back.
+        return babel.dates.format_datetime(dateutil.parser.parse(str(value)), pattern)
+
+    def native(value):
+        return fyyur.format_datetime(value, 'full')
+
+    results = {}
+    for name, render in (('reparse', reparse), ('native', native)):
+        started = time.perf_counter()
+        for value in times:
+            render(value)
+        results[name] = {'shows': count,
+                         'us_per_show': round((time.perf_counter() - started) / count * 1e6, 3)}
+    return results
+
+
+# Run in a fresh interpreter under -X importtime: seconds to import app, to
+# build it with create_app() and to answer the first request.
+STARTUP_SCRIPT = '''
+import time
+started = time.perf_counter()
+import app
+imported = time.perf_counter()
+application = app.create_app()
+created = time.perf_counter()
+status = application.test_client().get('/').status_code
+answered = time.perf_counter()
+print(imported - started, created - imported, answered - created, status)
+'''
+
+
+def startup(runs):
+    '''Cold start: import, app creation and first response, medians over
+    runs, with the slowest modules app imports (cumulative, including
+    what they import). -X importtime itself adds a little to every import.'''
+    samples, imports = [], {}
+    for _ in range(runs):
+        started = time.perf_counter()
+        result = subprocess.run([sys.executable, '-X', 'importtime', '-c', STARTUP_SCRIPT],
+                                capture_output=True, text=True, check=True)
+        process_s = time.perf_counter() - started
+        import_s, create_s, first_s, status = result.stdout.split()
+        samples.append({'import_ms': float(import_s) * 1000, 'create_app_ms': float(create_s) * 1000,
+                        'first_response_ms': float(first_s) * 1000, 'process_ms': process_s * 1000,
+                        'status': int(status)})
+        # "import time: self | cumulative | name", nesting shown by indent;
+        # a module's imports are listed before it.
+        pending = []
+        for line in result.stderr.splitlines():
+            if not line.startswith('import time:') or 'cumulative' in line:
+                continue
+            _, cumulative, name = line.split('|')
+            depth = (len(name) - len(name.lstrip()) - 1) // 2
+            if depth == 1:
+                pending.append((name.strip(), int(cumulative) / 1000))
+            elif depth == 0:
+                if name.strip() == 'app':
+                    for module, ms in pending:
+                        imports.setdefault(module, []).append(ms)
+                pending = []
+    summary = {key: round(percentile([sample[key] for sample in samples], 50), 1)
+               for key in ('import_ms', 'create_app_ms', 'first_response_ms', 'process_ms')}
+    summary['runs'] = runs
+    summary['statuses'] = sorted({sample['status'] for sample in samples})
+    slowest = sorted(((round(percentile(times, 50), 1), module) for module, times in imports.items()),
+                     reverse=True)[:10]
+    summary['slowest_imports_ms'] = {module: ms for ms, module in slowest}
+    return summary
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def wait_until_serving(url, process, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError('server exited with status {}'.format(process.returncode))
+        try:
+            urllib.request.urlopen(url, timeout=1).read()
+            return
+        except (urllib.error.URLError, ConnectionError):
+            time.sleep(0.2)
+    raise RuntimeError('server did not answer {} within {}s'.format(url, timeout))
+
+
+def load_test(fyyur, app, workers, server, concurrency, duration, cache, rng):
+    '''Requests/second from a real server for each worker count.
+
+    Starts the server command once per worker count against the seeded
+    database and keeps concurrency client threads busy with the read
+    routes for duration seconds.
+    '''
+    readers = [url for name, method, url, data in routes(fyyur, app, rng) if method == 'get']
+    paths = [rng.choice(readers)() for _ in range(5000)]
+    results = []
+    for count in workers:
+        port = free_port()
+        env = dict(os.environ, WEB_CONCURRENCY=str(count), CACHE_ENABLED='1' if cache else '0',
+                   SECRET_KEY=os.environ.get('SECRET_KEY', 'benchmark'))
+        process = subprocess.Popen(shlex.split(server.format(port=port, workers=count)), env=env,
+                                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        base = 'http://127.0.0.1:{}'.format(port)
+        try:
+            wait_until_serving(base + '/', process)
+            deadline = time.monotonic() + duration
+
+            def client(offset):
+                latencies, errors, i = [], 0, offset
+                while time.monotonic() < deadline:
+                    started = time.perf_counter()
+                    try:
+                        urllib.request.urlopen(base + paths[i % len(paths)], timeout=30).read()
+                        latencies.append((time.perf_counter() - started) * 1000)
+                    except (urllib.error.URLError, ConnectionError):
+                        errors += 1
+                    i += concurrency
+                return latencies, errors
+
+            with ThreadPoolExecutor(concurrency) as pool:
+                outcomes = list(pool.map(client, range(concurrency)))
+        finally:
+            process.terminate()
+            process.wait()
+        latencies = [value for outcome in outcomes for value in outcome[0]]
+        results.append({
+            'workers': count,
+            'requests': len(latencies),
+            'errors': sum(outcome[1] for outcome in outcomes),
+            'requests_per_second': round(len(latencies) / duration, 1),
+            'p50_ms': round(percentile(latencies, 50), 3) if latencies else None,
+            'p95_ms': round(percentile(latencies, 95), 3) if latencies else None,
+        })
+    return results
+
+
+def print_load_report(results):
+    print('{:>8} {:>10} {:>9} {:>9} {:>7} {:>8}'.format(
+        'workers', 'req/s', 'p50 ms', 'p95 ms', 'errors', 'scaling'))
+    base = results[0]['requests_per_second'] or 1
+    for row in results:
+        print('{:>8} {:>10.1f} {:>9} {:>9} {:>7} {:>7.2f}x'.format(
+            row['workers'], row['requests_per_second'], row['p50_ms'], row['p95_ms'],
+            row['errors'], row['requests_per_second'] / base))
+
+
+def print_report(results, baseline=None):
+    header = '{:<26} {:>9} {:>9} {:>9} {:>8}'.format('route', 'p50 ms', 'p95 ms', 'p99 ms', 'queries')
+    if baseline:
+        header += ' {:>10} {:>9}'.format('p95 delta', 'q delta')
+    print(header)
+    for name, row in results.items():
+        line = '{:<26} {:>9.2f} {:>9.2f} {:>9.2f} {:>8}'.format(
+            name, row['p50_ms'], row['p95_ms'], row['p99_ms'],
+            '-' if row['queries_per_request'] is None else row['queries_per_request'])
+        old = (baseline or {}).get(name)
+        if old:
+            line += ' {:>+9.1f}% {:>+9}'.format(
+                (row['p95_ms'] - old['p95_ms']) / old['p95_ms'] * 100 if old['p95_ms'] else 0.0,
+                round((row['queries_per_request'] or 0) - (old['queries_per_request'] or 0), 2))
+        print(line)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--shows', type=int, default=1000,
+                        help='catalog size in shows, e.g. 1000, 100000 or 1000000')
+    parser.add_argument('--database', default='sqlite:///' + os.path.abspath('benchmark.db'),
+                        help='database URL to seed and serve from (it is wiped)')
+    parser.add_argument('--requests', type=int, default=50, help='requests per route')
+    parser.add_argument('--seed', type=int, default=1, help='random seed')
+    parser.add_argument('--skip-seed', action='store_true', help='reuse the existing catalog')
+    parser.add_argument('--cache', action='store_true', help='leave the page cache on')
+    parser.add_argument('--out', default='benchmark.json', help='where to write the JSON results')
+    parser.add_argument('--compare', help='earlier results file to diff against')
+    parser.add_argument('--dates', type=int, metavar='N',
+                        help='only time formatting N show start times, before and after')
+    parser.add_argument('--workers', help='comma-separated worker counts for a load test, e.g. 1,2,4')
+    parser.add_argument('--server', default=DEFAULT_SERVER,
+                        help='server command for --workers, with {port} and {workers} placeholders')
+    parser.add_argument('--concurrency', type=int, default=16, help='client threads for --workers')
+    parser.add_argument('--duration', type=float, default=10, help='seconds per worker count')
+    parser.add_argument('--startup', type=int, metavar='RUNS',
+                        help='only time cold starts (import to first response) over RUNS processes')
+    args = parser.parse_args(argv)
+
+    # config.py reads the database URL when app is first imported.
+    os.environ['DATABASE_URL'] = args.database
+    if args.startup:
+        result = startup(args.startup)
+        with open(args.out, 'w') as f:
+            json.dump({'meta': {'commit': git_commit(), 'python': platform.python_version()},
+                       'startup': result}, f, indent=2)
+        for key in ('import_ms', 'create_app_ms', 'first_response_ms', 'process_ms'):
+            print('{:<20} {:>9.1f}'.format(key, result[key]))
+        print('Slowest imports (ms):')
+        for module, ms in result['slowest_imports_ms'].items():
+            print('  {:<26} {:>7.1f}'.format(module, ms))
+        return
+
+    import app as fyyur
+    app = fyyur.create_app()
+    app.config['CACHE_ENABLED'] = args.cache
+    app.logger.disabled = True
+    rng = random.Random(args.seed)
+
+    if args.dates:
+        results = date_formatting(fyyur, args.dates, rng)
+        for name, row in results.items():
+            print('{:<8} {:>9.2f} us/show'.format(name, row['us_per_show']))
+        print('{:.1f}x faster'.format(results['reparse']['us_per_show'] / results['native']['us_per_show']))
+        return
+
+    scale = None
+    if not args.skip_seed:
+        started = time.perf_counter()
+        with app.app_context():
+            scale = seed(fyyur, args.shows, rng)
+        print('Seeded {venues} venues, {artists} artists, {shows} shows'.format(**scale),
+              'in {:.1f}s'.format(time.perf_counter() - started))
+
+    with app.app_context():
+        dialect = fyyur.db.engine.dialect.name
+
+    if args.workers:
+        load = load_test(fyyur, app, [int(count) for count in args.workers.split(',')], args.server,
+                         args.concurrency, args.duration, args.cache, rng)
+        with open(args.out, 'w') as f:
+            json.dump({'meta': {'commit': git_commit(), 'database': dialect,
+                                'concurrency': args.concurrency, 'duration': args.duration},
+                       'load': load}, f, indent=2)
+        print_load_report(load)
+        return
+
+    results = run(fyyur, app, args.requests, rng)
+    report = {
+        'meta': {
+            'commit': git_commit(),
+            'created': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'database': dialect,
+            'scale': scale or {'shows': args.shows},
+            'requests_per_route': args.requests,
+            'cache': args.cache,
+            'peak_rss_kb': peak_rss_kb(),
+        },
+        'routes': results,
+    }
+    with open(args.out, 'w') as f:
+        json.dump(report, f, indent=2)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)['routes']
+    print_report(results, baseline)
+    print('Peak RSS {} KB; results written to {}'.format(report['meta']['peak_rss_kb'], args.out))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,130 @@
+import csv
+import json
+import time
+from datetime import datetime
+from itertools import islice
+
+# Column order for exported files; imports accept any subset of these.
+FIELDS = {
+    'venues': ['id', 'name', 'city', 'state', 'address', 'phone', 'image_link',
+               'facebook_link', 'website', 'genres', 'seeking_talent', 'seeking_description'],
+    'artists': ['id', 'name', 'city', 'state', 'phone', 'image_link', 'facebook_link',
+                'website', 'genres', 'seeking_venue', 'seeking_description'],
+    'shows': ['id', 'venue_id', 'artist_id', 'start_time', 'end_time'],
+}
+
+# CSV has no list type; genres are written as "Jazz|Folk".
+GENRE_SEPARATOR = '|'
+
+
+def parse_bool(value):
+    if isinstance(value, bool) or value is None:
+        return value
+    return str(value).strip().lower() in ('1', 'true', 't', 'yes', 'y')
+
+
+def parse_genres(value):
+    if value is None or isinstance(value, list):
+        return value
+    return [genre for genre in value.split(GENRE_SEPARATOR) if genre]
+
+
+def parse_datetime(value):
+    if value is None or isinstance(value, datetime):
+        return value
+    return datetime.fromisoformat(value)
+
+
+CONVERTERS = {
+    'id': int,
+    'venue_id': int,
+    'artist_id': int,
+    'genres': parse_genres,
+    'seeking_talent': parse_bool,
+    'seeking_venue': parse_bool,
+    'start_time': parse_datetime,
+    'end_time': parse_datetime,
+}
+
+
+def format_for(path, fmt=None):
+    if fmt:
+        return fmt
+    return 'ndjson' if path.endswith(('.ndjson', '.jsonl')) else 'csv'
+
+
+def chunked(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def read_records(stream, fmt, kind):
+    '''Yields one normalized dict per input row, reading lazily.
+
+    Only fields the row has (a CSV column, an NDJSON key) are in the
+    result, so an upsert can leave the others alone; empty values are None
+    and the rest are converted to their Python types. A row with a value
+    that does not convert (a bad date, a number where text belongs) is
+    yielded as None, for the caller to count as rejected.
+    '''
+    if fmt == 'ndjson':
+        rows = (json.loads(line) for line in stream if line.strip())
+    else:
+        rows = csv.DictReader(stream)
+    for row in rows:
+        try:
+            yield convert(row, kind)
+        except (ValueError, TypeError):
+            yield None
+
+
+def convert(row, kind):
+    record = {}
+    for field in FIELDS[kind]:
+        if field not in row:
+            continue
+        value = row[field]
+        if value == '':
+            value = None
+        if value is not None and field in CONVERTERS:
+            value = CONVERTERS[field](value)
+        record[field] = value
+    return record
+
+
+def write_records(stream, fmt, kind, records):
+    fields = FIELDS[kind]
+    if fmt == 'csv':
+        writer = csv.DictWriter(stream, fieldnames=fields)
+        writer.writeheader()
+    count = 0
+    for record in records:
+        if fmt == 'ndjson':
+            stream.write(json.dumps(record, default=str) + '\n')
+        else:
+            row = dict(record)
+            if row.get('genres') is not None:
+                row['genres'] = GENRE_SEPARATOR.join(row['genres'])
+            writer.writerow(row)
+        count += 1
+    return count
+
+
+class Throughput(object):
+    '''Running row counter for progress reports.'''
+
+    def __init__(self):
+        self.started = time.monotonic()
+        self.rows = 0
+
+    def add(self, rows):
+        self.rows += rows
+
+    @property
+    def rate(self):
+        elapsed = time.monotonic() - self.started
+        return self.rows / elapsed if elapsed > 0 else 0.0
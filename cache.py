@@ -0,0 +1,146 @@
+import threading
+import time
+from collections import OrderedDict
+
+from flask import current_app
+
+
+class LRUCache(object):
+    '''In-process least-recently-used cache with a per-entry time to live.'''
+
+    def __init__(self, maxsize=1024, ttl=300):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, *keys):
+        with self._lock:
+            for key in keys:
+                self._data.pop(key, None)
+
+    def incr(self, key):
+        # Counters live outside the LRU so they are never evicted.
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + 1
+            return self._counters[key]
+
+    def counter(self, key):
+        with self._lock:
+            return self._counters.get(key, 0)
+
+    def __len__(self):
+        return len(self._data)
+
+
+class RedisCache(object):
+    '''Shared cache for multi-process deployments; needs the redis package.'''
+
+    def __init__(self, url, ttl=300, prefix='fyyur:'):
+        import redis
+        self.client = redis.Redis.from_url(url)
+        self.ttl = ttl
+        self.maxsize = None
+        self.prefix = prefix
+
+    def get(self, key):
+        value = self.client.get(self.prefix + key)
+        return value.decode('utf-8') if value is not None else None
+
+    def set(self, key, value):
+        self.client.setex(self.prefix + key, self.ttl, value)
+
+    def delete(self, *keys):
+        if keys:
+            self.client.delete(*(self.prefix + key for key in keys))
+
+    def incr(self, key):
+        return self.client.incr(self.prefix + key)
+
+    def counter(self, key):
+        return int(self.client.get(self.prefix + key) or 0)
+
+    def __len__(self):
+        return self.client.dbsize()
+
+
+class PageCache(object):
+    '''Read-through cache of rendered pages with hit/miss accounting.
+
+    Entity pages are keyed by id ("venue:1") and dropped individually.
+    List pages are keyed by a generation number per list, so bumping the
+    generation invalidates every page of that list at once.
+    '''
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        ttl = app.config.get('CACHE_TTL', 300)
+        if app.config.get('CACHE_TYPE', 'lru') == 'redis':
+            backend = RedisCache(app.config['CACHE_REDIS_URL'], ttl)
+        else:
+            backend = LRUCache(app.config.get('CACHE_MAXSIZE', 1024), ttl)
+        app.extensions['page_cache'] = {'backend': backend, 'hits': 0, 'misses': 0, 'lock': threading.Lock()}
+
+    @property
+    def backend(self):
+        return current_app.extensions['page_cache']['backend']
+
+    def get(self, key):
+        state = current_app.extensions['page_cache']
+        value = state['backend'].get(key)
+        with state['lock']:
+            if value is None:
+                state['misses'] += 1
+            else:
+                state['hits'] += 1
+        return value
+
+    def set(self, key, value):
+        self.backend.set(key, value)
+
+    def generation(self, name):
+        return self.backend.counter('gen:' + name)
+
+    def list_key(self, name, variant=''):
+        return '{}:{}:{}'.format(name, self.generation(name), variant)
+
+    def invalidate(self, keys=(), lists=()):
+        self.backend.delete(*keys)
+        for name in lists:
+            self.backend.incr('gen:' + name)
+
+    def stats(self):
+        state = current_app.extensions['page_cache']
+        with state['lock']:
+            hits, misses = state['hits'], state['misses']
+        total = hits + misses
+        return {
+            'hits': hits,
+            'misses': misses,
+            'hit_ratio': hits / total if total else 0.0,
+            'size': len(state['backend']),
+            'maxsize': state['backend'].maxsize
+        }
@@ -0,0 +1,95 @@
+import gzip
+import zlib
+
+from flask import current_app, request
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+def gzip_stream(chunks, level):
+    # Sync-flushes after every chunk so the client can start decoding (and
+    # the browser rendering) before the body is complete.
+    compressor = zlib.compressobj(level, zlib.DEFLATED, zlib.MAX_WBITS | 16)
+    for chunk in chunks:
+        data = compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def brotli_stream(chunks, quality):
+    compressor = brotli.Compressor(quality=quality)
+    for chunk in chunks:
+        data = compressor.process(chunk) + compressor.flush()
+        if data:
+            yield data
+    yield compressor.finish()
+
+
+class Compress(object):
+    '''On-the-fly gzip/brotli compression of responses.
+
+    Buffered bodies smaller than COMPRESS_MIN_SIZE go out as they are;
+    streamed bodies are compressed chunk by chunk. Responses that already
+    carry a Content-Encoding (the precompressed assets) and file responses
+    are left alone. Brotli is used when the brotli package is installed and
+    the client accepts it.
+    '''
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        # Settings live on the app, so one Compress serves several apps.
+        app.extensions['compress'] = {
+            'min_size': app.config.get('COMPRESS_MIN_SIZE', 500),
+            'mimetypes': frozenset(app.config.get('COMPRESS_MIMETYPES', ())),
+            'gzip_level': app.config.get('COMPRESS_GZIP_LEVEL', 6),
+            'brotli_quality': app.config.get('COMPRESS_BROTLI_QUALITY', 4),
+        }
+        if app.config.get('COMPRESS_ENABLED', True):
+            app.after_request(self.compress)
+
+    def encoding(self):
+        accepted = request.accept_encodings
+        if brotli is not None and accepted['br']:
+            return 'br'
+        if accepted['gzip']:
+            return 'gzip'
+        return None
+
+    def compress(self, response):
+        settings = current_app.extensions['compress']
+        if response.status_code < 200 or response.status_code in (204, 304) \
+                or response.direct_passthrough or 'Content-Encoding' in response.headers \
+                or response.mimetype not in settings['mimetypes']:
+            return response
+        response.vary.add('Accept-Encoding')
+        encoding = self.encoding()
+        if encoding is None:
+            return response
+        if response.is_streamed:
+            chunks = response.iter_encoded()
+            if encoding == 'br':
+                response.response = brotli_stream(chunks, settings['brotli_quality'])
+            else:
+                response.response = gzip_stream(chunks, settings['gzip_level'])
+            response.headers.pop('Content-Length', None)
+        else:
+            data = response.get_data()
+            if len(data) < settings['min_size']:
+                return response
+            if encoding == 'br':
+                response.set_data(brotli.compress(data, quality=settings['brotli_quality']))
+            else:
+                response.set_data(gzip.compress(data, settings['gzip_level']))
+        response.headers['Content-Encoding'] = encoding
+        # The body bytes changed, so a strong validator no longer holds.
+        etag, weak = response.get_etag()
+        if etag and not weak:
+            response.set_etag(etag, weak=True)
+        return response
@@ -0,0 +1,112 @@
+import csv
+import math
+import os
+from functools import lru_cache
+
+# Offline gazetteer: city,state,latitude,longitude rows. Venues are located
+# at the centre of their city; nothing here ever goes to the network.
+GAZETTEER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'gazetteer.csv')
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+
+# Stored geohashes are this long (cells of a few metres); searches use
+# prefixes of them.
+PRECISION = 9
+_BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+
+
+def place_key(city, state):
+    return ' '.join((city or '').split()).lower(), (state or '').strip().upper()
+
+
+@lru_cache(maxsize=None)
+def gazetteer(path=GAZETTEER):
+    with open(path, newline='', encoding='utf-8') as f:
+        return {place_key(row['city'], row['state']): (float(row['latitude']), float(row['longitude']))
+                for row in csv.DictReader(f)}
+
+
+def geocode(city, state):
+    '''(latitude, longitude) of city, state, or None if it is not in the gazetteer.'''
+    return gazetteer().get(place_key(city, state))
+
+
+def encode(latitude, longitude, precision=PRECISION):
+    lat_range, lng_range = [-90.0, 90.0], [-180.0, 180.0]
+    chars, bits, count, even = [], 0, 0, True
+    while len(chars) < precision:
+        bounds, value = (lng_range, longitude) if even else (lat_range, latitude)
+        mid = (bounds[0] + bounds[1]) / 2
+        if value >= mid:
+            bits, bounds[0] = bits * 2 + 1, mid
+        else:
+            bits, bounds[1] = bits * 2, mid
+        even = not even
+        count += 1
+        if count == 5:
+            chars.append(_BASE32[bits])
+            bits = count = 0
+    return ''.join(chars)
+
+
+def prefix_range(cell):
+    '''(low, high) such that low <= geohash < high exactly when geohash
+    starts with cell; high is None when there is no upper bound.
+
+    Only alphabet characters are used, so the bounds order the same way
+    under PostgreSQL's locale collations as under SQLite's binary one.
+    '''
+    stem = cell
+    while stem and stem[-1] == _BASE32[-1]:
+        stem = stem[:-1]
+    if not stem:
+        return cell, None
+    return cell, stem[:-1] + _BASE32[_BASE32.index(stem[-1]) + 1]
+
+
+def cell_size(precision):
+    '''(height, width) in degrees of the geohash cells of this length.'''
+    bits = 5 * precision
+    return 180.0 / 2 ** (bits // 2), 360.0 / 2 ** ((bits + 1) // 2)
+
+
+def location(city, state):
+    '''Column values locating a venue in city, state; all None when unknown.'''
+    point = geocode(city, state)
+    if point is None:
+        return {'latitude': None, 'longitude': None, 'geohash': None}
+    return {'latitude': point[0], 'longitude': point[1], 'geohash': encode(*point)}
+
+
+def distance_km(lat1, lng1, lat2, lng2):
+    # Haversine, on a spherical earth.
+    lat1, lng1, lat2, lng2 = map(math.radians, (lat1, lng1, lat2, lng2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + \
+        math.cos(lat1) * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def covering_cells(latitude, longitude, radius_km):
+    '''Geohash prefixes whose cells together cover the circle.
+
+    Picks the longest prefix whose cells are at least radius_km tall and
+    wide, so the circle lies within the 3x3 block of cells around the
+    centre. Returns [''] (everything) when no prefix is coarse enough.
+    '''
+    # Cells narrow towards the poles; size them for the circle's far edge.
+    edge = min(abs(latitude) + radius_km / KM_PER_DEGREE, 89.9)
+    for precision in range(PRECISION, 0, -1):
+        height, width = cell_size(precision)
+        if height * KM_PER_DEGREE >= radius_km and \
+                width * KM_PER_DEGREE * math.cos(math.radians(edge)) >= radius_km:
+            break
+    else:
+        return ['']
+    cells = set()
+    for dy in (-1, 0, 1):
+        lat = max(min(latitude + dy * height, 89.999999), -89.999999)
+        for dx in (-1, 0, 1):
+            lng = (longitude + dx * width + 180) % 360 - 180
+            cells.add(encode(lat, lng, precision))
+    return sorted(cells)
@@ -0,0 +1,34 @@
+# gunicorn settings for wsgi:application. The worker counts come from
+# config.py, which also sizes each worker's connection pool from them.
+import os
+
+from config import WORKER_CLASS, WORKERS, THREADS, WORKER_CONNECTIONS
+
+bind = os.environ.get('BIND', '0.0.0.0:' + os.environ.get('PORT', '8000'))
+worker_class = WORKER_CLASS
+workers = WORKERS
+threads = THREADS
+worker_connections = WORKER_CONNECTIONS
+timeout = 30
+keepalive = 5
+accesslog = '-'
+
+# gevent has to patch the standard library before the app is imported, so
+# only threaded workers load the app once in the master and fork it.
+preload_app = WORKER_CLASS != 'gevent'
+
+
+def post_fork(server, worker):
+    if WORKER_CLASS == 'gevent':
+        try:
+            from psycogreen.gevent import patch_psycopg
+        except ImportError:
+            server.log.warning('psycogreen is not installed; psycopg2 calls will block the gevent loop.')
+        else:
+            patch_psycopg()
+    if preload_app:
+        # Connections opened in the master must not be shared with children.
+        from wsgi import application, db
+        with application.app_context():
+            for bind in [None] + list(application.config.get('SQLALCHEMY_BINDS') or ()):
+                db.get_engine(application, bind).dispose()
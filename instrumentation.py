@@ -0,0 +1,117 @@
+import json
+import re
+import threading
+import time
+from collections import Counter, deque
+
+from flask import current_app, g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+_literals = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_in_lists = re.compile(r'\bIN \((?:\?(?:, )?)+\)', re.IGNORECASE)
+_spaces = re.compile(r'\s+')
+
+
+def fingerprint(statement):
+    '''Normalizes a statement so repeats that differ only in literals match.'''
+    statement = _literals.sub('?', statement)
+    statement = _spaces.sub(' ', statement).strip()
+    return _in_lists.sub('IN (...)', statement)
+
+
+class RequestStats(object):
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_time = 0.0
+        self.statements = Counter()
+
+    def record(self, statement, duration):
+        self.queries += 1
+        self.db_time += duration
+        self.statements[fingerprint(statement)] += 1
+
+    def repeated(self, limit=5):
+        return {statement: count for statement, count in self.statements.most_common(limit) if count > 1}
+
+
+class SQLInstrumentation(object):
+    '''Per-request SQL accounting.
+
+    Counts the queries each request runs and their cumulative time, and
+    spots statements repeated within one request (the usual N+1 shape).
+    Every request gets a Server-Timing header and one JSON log line, with
+    a warning once it runs more than SQL_QUERY_WARN_THRESHOLD queries.
+    With SQL_DEBUG_REQUESTS set, /debug/requests lists recent requests.
+    '''
+
+    def __init__(self, app=None):
+        self._listening = False
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        # The threshold and recent requests are kept per app. The engine
+        # listeners are process-wide and only count inside a request that
+        # _start() has set up, so they are registered once.
+        app.extensions['sql_instrumentation'] = {
+            'threshold': app.config.get('SQL_QUERY_WARN_THRESHOLD', 20),
+            'recent': deque(maxlen=100),
+            'lock': threading.Lock(),
+        }
+        if not self._listening:
+            event.listen(Engine, 'before_cursor_execute', self._before_cursor_execute)
+            event.listen(Engine, 'after_cursor_execute', self._after_cursor_execute)
+            self._listening = True
+        app.before_request(self._start)
+        app.after_request(self._finish)
+        if app.config.get('SQL_DEBUG_REQUESTS'):
+            app.add_url_rule('/debug/requests', 'debug_requests', self.debug_requests)
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        if has_request_context() and 'sql_stats' in g:
+            conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        if has_request_context() and 'sql_stats' in g and conn.info.get('query_started'):
+            started = conn.info['query_started'].pop()
+            g.sql_stats.record(statement, time.perf_counter() - started)
+
+    def _start(self):
+        g.sql_stats = RequestStats()
+
+    def _finish(self, response):
+        stats = g.pop('sql_stats', None)
+        if stats is None:
+            return response
+        total_ms = (time.perf_counter() - stats.started) * 1000
+        db_ms = stats.db_time * 1000
+        response.headers.add('Server-Timing', 'db;dur={:.2f};desc="{} queries"'.format(db_ms, stats.queries))
+        response.headers.add('Server-Timing', 'app;dur={:.2f}'.format(total_ms))
+        summary = {
+            'method': request.method,
+            'path': request.full_path.rstrip('?'),
+            'endpoint': request.endpoint,
+            'status': response.status_code,
+            'queries': stats.queries,
+            'db_ms': round(db_ms, 2),
+            'total_ms': round(total_ms, 2),
+            'repeated': stats.repeated()
+        }
+        state = current_app.extensions['sql_instrumentation']
+        with state['lock']:
+            state['recent'].append(summary)
+        line = json.dumps(summary)
+        if stats.queries > state['threshold']:
+            current_app.logger.warning('sql query threshold exceeded: %s', line)
+        else:
+            current_app.logger.info('sql: %s', line)
+        return response
+
+    def debug_requests(self):
+        state = current_app.extensions['sql_instrumentation']
+        with state['lock']:
+            recent = list(state['recent'])
+        return {'threshold': state['threshold'], 'requests': recent[::-1]}
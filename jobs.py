@@ -0,0 +1,253 @@
+import heapq
+import itertools
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from flask import current_app
+
+
+class MemoryQueue(object):
+    '''Jobs held in this process; lost if it exits before running them.'''
+
+    def __init__(self):
+        self._heap = []
+        self._ids = itertools.count(1)
+        self._ready = threading.Condition()
+
+    def put(self, name, args, delay=0, attempts=0, job_id=None):
+        job = {'id': job_id or next(self._ids), 'name': name, 'args': args, 'attempts': attempts}
+        with self._ready:
+            heapq.heappush(self._heap, (time.time() + delay, job['id'], job))
+            self._ready.notify()
+
+    def take(self, timeout):
+        '''The next due job, or None once timeout seconds pass without one.'''
+        deadline = time.time() + timeout
+        with self._ready:
+            while True:
+                now = time.time()
+                if self._heap and self._heap[0][0] <= now:
+                    return heapq.heappop(self._heap)[2]
+                if now >= deadline:
+                    return None
+                wait = deadline - now
+                if self._heap:
+                    wait = min(wait, self._heap[0][0] - now)
+                self._ready.wait(wait)
+
+    def done(self, job):
+        pass
+
+    def retry(self, job, delay, error):
+        self.put(job['name'], job['args'], delay, job['attempts'], job['id'])
+
+    def fail(self, job, error):
+        pass
+
+    def counts(self):
+        with self._ready:
+            return {'pending': len(self._heap), 'failed': 0}
+
+
+class SQLiteQueue(object):
+    '''Jobs kept in a SQLite file shared by every process on the host.
+
+    Workers claim a job for claim_timeout seconds; a job whose worker died
+    is claimed again once that runs out, so jobs run at least once. Jobs
+    that used up their attempts stay in the table with their last error.
+    '''
+
+    def __init__(self, path, claim_timeout=300, poll_interval=1.0):
+        self.path = path
+        self.claim_timeout = claim_timeout
+        self.poll_interval = poll_interval
+        # Wakes this process's workers at once; other processes poll.
+        self._wakeup = threading.Event()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute('PRAGMA journal_mode = WAL')
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS jobs ('
+                ' id INTEGER PRIMARY KEY,'
+                ' name TEXT NOT NULL,'
+                ' args TEXT NOT NULL,'
+                ' attempts INTEGER NOT NULL DEFAULT 0,'
+                ' run_at REAL NOT NULL,'
+                ' claimed_until REAL NOT NULL DEFAULT 0,'
+                ' failed INTEGER NOT NULL DEFAULT 0,'
+                ' error TEXT)')
+            conn.execute('CREATE INDEX IF NOT EXISTS ix_jobs_due ON jobs (failed, run_at)')
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.execute('PRAGMA busy_timeout = 30000')
+        return _Closing(conn)
+
+    def put(self, name, args, delay=0):
+        with self._connect() as conn:
+            conn.execute('INSERT INTO jobs (name, args, run_at) VALUES (?, ?, ?)',
+                         (name, json.dumps(args), time.time() + delay))
+        self._wakeup.set()
+
+    def take(self, timeout):
+        deadline = time.time() + timeout
+        while True:
+            job = self._claim()
+            if job is not None or time.time() >= deadline:
+                return job
+            self._wakeup.wait(min(self.poll_interval, max(deadline - time.time(), 0)))
+            self._wakeup.clear()
+
+    def _claim(self):
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute('BEGIN IMMEDIATE')
+            row = conn.execute(
+                'SELECT id, name, args, attempts FROM jobs'
+                ' WHERE failed = 0 AND run_at <= ? AND claimed_until <= ?'
+                ' ORDER BY run_at LIMIT 1', (now, now)).fetchone()
+            if row is not None:
+                conn.execute('UPDATE jobs SET claimed_until = ? WHERE id = ?',
+                             (now + self.claim_timeout, row[0]))
+            conn.execute('COMMIT')
+        if row is None:
+            return None
+        return {'id': row[0], 'name': row[1], 'args': json.loads(row[2]), 'attempts': row[3]}
+
+    def done(self, job):
+        with self._connect() as conn:
+            conn.execute('DELETE FROM jobs WHERE id = ?', (job['id'],))
+
+    def retry(self, job, delay, error):
+        with self._connect() as conn:
+            conn.execute('UPDATE jobs SET attempts = ?, run_at = ?, claimed_until = 0, error = ? WHERE id = ?',
+                         (job['attempts'], time.time() + delay, error, job['id']))
+
+    def fail(self, job, error):
+        with self._connect() as conn:
+            conn.execute('UPDATE jobs SET attempts = ?, failed = 1, error = ? WHERE id = ?',
+                         (job['attempts'], error, job['id']))
+
+    def counts(self):
+        with self._connect() as conn:
+            return dict(zip(('pending', 'failed'), conn.execute(
+                'SELECT coalesce(sum(failed = 0), 0), coalesce(sum(failed), 0) FROM jobs').fetchone()))
+
+
+class _Closing(object):
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        return self.conn
+
+    def __exit__(self, *exc_info):
+        if exc_info[0] is not None and self.conn.in_transaction:
+            self.conn.execute('ROLLBACK')
+        self.conn.close()
+
+
+class JobQueue(object):
+    '''Runs follow-up work of a request after its response has gone out.
+
+    Functions registered with @jobs.task get a .delay(*args) that queues a
+    call. The arguments must be JSON-serializable. JOBS_BACKEND selects
+    where queued calls wait:
+      'memory' (default) - in this process, run by JOBS_WORKERS threads;
+      'sqlite' - in the JOBS_SQLITE_PATH file, shared by every process on
+                 the host and kept across restarts;
+      'inline' - run at once, in the caller (CLI commands, debugging).
+    A failing job runs again after JOBS_RETRY_BACKOFF seconds, doubled on
+    every attempt, up to JOBS_MAX_ATTEMPTS attempts. Jobs run inside an
+    app context.
+    '''
+
+    def __init__(self, app=None):
+        # Tasks are shared; the queue and its workers belong to each app.
+        self.tasks = {}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        state = {
+            'app': app,
+            'backend': app.config.get('JOBS_BACKEND', 'memory'),
+            'workers': app.config.get('JOBS_WORKERS', 2),
+            'max_attempts': app.config.get('JOBS_MAX_ATTEMPTS', 5),
+            'backoff': app.config.get('JOBS_RETRY_BACKOFF', 2.0),
+            'pid': None,
+            'lock': threading.Lock(),
+        }
+        app.extensions['jobs'] = state
+        if state['backend'] == 'sqlite':
+            state['queue'] = SQLiteQueue(app.config['JOBS_SQLITE_PATH'])
+            # Jobs queued by other processes, or left from before a restart,
+            # are only picked up once this process has workers.
+            app.before_request(self.start)
+        else:
+            state['queue'] = MemoryQueue()
+
+    def task(self, func):
+        self.tasks[func.__name__] = func
+        func.delay = lambda *args: self.enqueue(func.__name__, *args)
+        return func
+
+    def enqueue(self, name, *args):
+        state = current_app.extensions['jobs']
+        if state['backend'] == 'inline':
+            # One attempt; a failure is logged, never raised into the caller.
+            job = {'id': None, 'name': name, 'args': list(args), 'attempts': state['max_attempts'] - 1}
+            self.run(state, job)
+            return
+        state['queue'].put(name, list(args))
+        self.start()
+
+    def start(self):
+        '''Starts the current app's worker threads, once per process.'''
+        state = current_app.extensions['jobs']
+        # The pid check also covers gunicorn's preload: threads of the
+        # master do not survive the fork.
+        if state['pid'] == os.getpid():
+            return
+        with state['lock']:
+            if state['pid'] == os.getpid():
+                return
+            for i in range(state['workers']):
+                threading.Thread(target=self._work, args=(state,),
+                                 name='fyyur-jobs-{}'.format(i), daemon=True).start()
+            state['pid'] = os.getpid()
+
+    def counts(self):
+        return current_app.extensions['jobs']['queue'].counts()
+
+    def _work(self, state):
+        while True:
+            job = state['queue'].take(timeout=60)
+            if job is not None:
+                self.run(state, job)
+
+    def run(self, state, job):
+        app, queue = state['app'], state['queue']
+        job['attempts'] += 1
+        try:
+            with app.app_context():
+                self.tasks[job['name']](*job['args'])
+        except Exception as e:
+            error = '{}: {}'.format(type(e).__name__, e)
+            if job['attempts'] >= state['max_attempts']:
+                app.logger.error('job %s%s failed for good after %d attempts: %s',
+                                 job['name'], tuple(job['args']), job['attempts'], error)
+                queue.fail(job, error)
+            else:
+                delay = state['backoff'] * 2 ** (job['attempts'] - 1)
+                app.logger.warning('job %s%s failed (attempt %d), retrying in %gs: %s',
+                                   job['name'], tuple(job['args']), job['attempts'], delay, error)
+                queue.retry(job, delay, error)
+        else:
+            queue.done(job)
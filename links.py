@@ -0,0 +1,83 @@
+import http.client
+import ipaddress
+import socket
+import ssl
+from urllib.parse import urlsplit
+
+
+class UnsafeLink(ValueError):
+    '''The link is not http(s) or its host is not on the public internet.'''
+
+
+_NAT64 = ipaddress.ip_network('64:ff9b::/96')
+
+
+def is_public(address):
+    address = ipaddress.ip_address(address.split('%')[0])
+    if address.version == 6:
+        # IPv6 forms that carry an IPv4 address are judged by that address.
+        embedded = address.ipv4_mapped or address.sixtofour
+        if embedded is None and address in _NAT64:
+            embedded = ipaddress.ip_address(int(address) & 0xffffffff)
+        if embedded is not None and not embedded.is_global:
+            return False
+    return address.is_global
+
+
+def public_address(host, port):
+    '''An address of host to connect to; raises UnsafeLink if any of its
+    addresses is private, loopback, link-local or otherwise not global.'''
+    addresses = {info[4][0] for info in socket.getaddrinfo(host, port, type=socket.SOCK_STREAM)}
+    for address in addresses:
+        if not is_public(address):
+            raise UnsafeLink('{} resolves to {}'.format(host, address))
+    return sorted(addresses)[0]
+
+
+class _PinnedHTTPConnection(http.client.HTTPConnection):
+    # Connects to the address that was checked rather than resolving the
+    # host again, which a DNS answer could point elsewhere in between.
+
+    def __init__(self, host, port, address, **kwargs):
+        super(_PinnedHTTPConnection, self).__init__(host, port, **kwargs)
+        self.address = address
+
+    def connect(self):
+        self.sock = socket.create_connection((self.address, self.port), self.timeout)
+
+
+class _PinnedHTTPSConnection(http.client.HTTPSConnection):
+
+    def __init__(self, host, port, address, **kwargs):
+        super(_PinnedHTTPSConnection, self).__init__(host, port, **kwargs)
+        self.address = address
+
+    def connect(self):
+        sock = socket.create_connection((self.address, self.port), self.timeout)
+        self.sock = self._context.wrap_socket(sock, server_hostname=self.host)
+
+
+def head(url, timeout):
+    '''(status, content type) of a HEAD request for url.
+
+    Only public addresses are contacted and redirects are not followed, so
+    a submitted link cannot make the server probe internal hosts.
+    '''
+    parts = urlsplit(url)
+    if parts.scheme not in ('http', 'https') or not parts.hostname:
+        raise UnsafeLink('not an http(s) link: {}'.format(url))
+    secure = parts.scheme == 'https'
+    port = parts.port or (443 if secure else 80)
+    address = public_address(parts.hostname, port)
+    if secure:
+        conn = _PinnedHTTPSConnection(parts.hostname, port, address, timeout=timeout,
+                                      context=ssl.create_default_context())
+    else:
+        conn = _PinnedHTTPConnection(parts.hostname, port, address, timeout=timeout)
+    try:
+        conn.request('HEAD', (parts.path or '/') + ('?' + parts.query if parts.query else ''),
+                     headers={'User-Agent': 'fyyur-link-check'})
+        response = conn.getresponse()
+        return response.status, response.headers.get_content_type()
+    finally:
+        conn.close()
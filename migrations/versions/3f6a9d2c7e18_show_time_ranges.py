@@ -0,0 +1,52 @@
+"""show end times, range check and double-booking exclusion
+
+Revision ID: 3f6a9d2c7e18
+Revises: 5e7b2c8d4a19
+Create Date: 2026-10-18 19:40:11.204817
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f6a9d2c7e18'
+down_revision = '5e7b2c8d4a19'
+branch_labels = None
+depends_on = None
+
+EXCLUDED = ('venue_id', 'artist_id')
+
+
+def upgrade():
+    with op.batch_alter_table('shows') as batch_op:
+        batch_op.add_column(sa.Column('end_time', sa.DateTime(), nullable=True))
+
+    # Existing shows get the default length of two hours.
+    if op.get_bind().dialect.name == 'sqlite':
+        # Keep SQLAlchemy's "YYYY-MM-DD HH:MM:SS.ffffff" text format.
+        op.execute("UPDATE shows SET end_time = datetime(start_time, '+120 minutes') || substr(start_time, 20)")
+    else:
+        op.execute("UPDATE shows SET end_time = start_time + interval '120 minutes'")
+
+    with op.batch_alter_table('shows') as batch_op:
+        batch_op.alter_column('end_time', existing_type=sa.DateTime(), nullable=False)
+        batch_op.create_check_constraint('shows_time_range_check', 'end_time > start_time')
+
+    if op.get_bind().dialect.name == 'postgresql':
+        # Fails if the existing data already double-books a venue or artist;
+        # those shows have to be moved or removed first.
+        op.execute('CREATE EXTENSION IF NOT EXISTS btree_gist')
+        for column in EXCLUDED:
+            op.execute('ALTER TABLE shows ADD CONSTRAINT shows_{0}_excl '
+                       'EXCLUDE USING gist ({0} WITH =, tsrange(start_time, end_time) WITH &&)'.format(column))
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'postgresql':
+        for column in EXCLUDED:
+            op.execute('ALTER TABLE shows DROP CONSTRAINT shows_{}_excl'.format(column))
+
+    with op.batch_alter_table('shows') as batch_op:
+        batch_op.drop_constraint('shows_time_range_check', type_='check')
+        batch_op.drop_column('end_time')
@@ -0,0 +1,32 @@
+"""trigram indexes on venue and artist names
+
+Revision ID: 4b1f0c9a7d21
+Revises: e678e260c139
+Create Date: 2026-10-18 16:52:10.412208
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '4b1f0c9a7d21'
+down_revision = 'e678e260c139'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # pg_trgm lets the GIN index answer ILIKE '%term%' searches; other
+    # dialects get a plain btree index on name.
+    if op.get_bind().dialect.name == 'postgresql':
+        op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    op.create_index('ix_venues_name_trgm', 'venues', ['name'], unique=False,
+                    postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops'})
+    op.create_index('ix_artists_name_trgm', 'artists', ['name'], unique=False,
+                    postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops'})
+
+
+def downgrade():
+    op.drop_index('ix_artists_name_trgm', table_name='artists')
+    op.drop_index('ix_venues_name_trgm', table_name='venues')
@@ -0,0 +1,50 @@
+"""precomputed show counters on venues and artists
+
+Revision ID: 5e7b2c8d4a19
+Revises: d81a6f3b0e52
+Create Date: 2026-10-18 18:48:02.671305
+
+"""
+from datetime import datetime
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5e7b2c8d4a19'
+down_revision = 'd81a6f3b0e52'
+branch_labels = None
+depends_on = None
+
+OWNERS = (('venues', 'venue_id'), ('artists', 'artist_id'))
+
+
+def upgrade():
+    for owner, key in OWNERS:
+        with op.batch_alter_table(owner) as batch_op:
+            batch_op.add_column(sa.Column('past_shows_count', sa.Integer(), server_default='0', nullable=False))
+            batch_op.add_column(sa.Column('upcoming_shows_count', sa.Integer(), server_default='0', nullable=False))
+            batch_op.add_column(sa.Column('next_show_time', sa.DateTime(), nullable=True))
+            batch_op.create_index('ix_{}_next_show_time'.format(owner), ['next_show_time'], unique=False)
+        # Backfill against the current time; `flask fyyur roll-shows` keeps
+        # the counters moving afterwards. The app compares show times with
+        # naive local datetime.now(), so the cut-off is bound from Python:
+        # CURRENT_TIMESTAMP is UTC on SQLite and timestamptz on PostgreSQL.
+        op.execute(sa.text(
+            'UPDATE {owner} SET '
+            'past_shows_count = (SELECT count(*) FROM shows '
+            'WHERE shows.{key} = {owner}.id AND shows.start_time <= :now), '
+            'upcoming_shows_count = (SELECT count(*) FROM shows '
+            'WHERE shows.{key} = {owner}.id AND shows.start_time > :now), '
+            'next_show_time = (SELECT min(shows.start_time) FROM shows '
+            'WHERE shows.{key} = {owner}.id AND shows.start_time > :now)'.format(owner=owner, key=key)
+        ).bindparams(sa.bindparam('now', datetime.now(), type_=sa.DateTime())))
+
+def downgrade():
+    for owner, _ in OWNERS:
+        with op.batch_alter_table(owner) as batch_op:
+            batch_op.drop_index('ix_{}_next_show_time'.format(owner))
+            batch_op.drop_column('next_show_time')
+            batch_op.drop_column('upcoming_shows_count')
+            batch_op.drop_column('past_shows_count')
@@ -0,0 +1,33 @@
+"""venue coordinates and geohash index
+
+Revision ID: 7a2d4e9b1c63
+Revises: 3f6a9d2c7e18
+Create Date: 2026-10-18 21:12:40.118734
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7a2d4e9b1c63'
+down_revision = '3f6a9d2c7e18'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Existing venues are located afterwards with `flask fyyur geocode`.
+    with op.batch_alter_table('venues') as batch_op:
+        batch_op.add_column(sa.Column('latitude', sa.Float(), nullable=True))
+        batch_op.add_column(sa.Column('longitude', sa.Float(), nullable=True))
+        batch_op.add_column(sa.Column('geohash', sa.String(length=12), nullable=True))
+        batch_op.create_index('ix_venues_geohash', ['geohash'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('venues') as batch_op:
+        batch_op.drop_index('ix_venues_geohash')
+        batch_op.drop_column('geohash')
+        batch_op.drop_column('longitude')
+        batch_op.drop_column('latitude')
@@ -0,0 +1,86 @@
+"""move genres into a genres table with venue/artist association tables
+
+Revision ID: 9c3e5d2a1f47
+Revises: 4b1f0c9a7d21
+Create Date: 2026-10-18 17:20:41.093512
+
+"""
+import ast
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9c3e5d2a1f47'
+down_revision = '4b1f0c9a7d21'
+branch_labels = None
+depends_on = None
+
+OWNERS = (
+    ('venues', 'venue_genres', 'venue_id', 500),
+    ('artists', 'artist_genres', 'artist_id', 120),
+)
+
+genres = sa.Table('genres', sa.MetaData(),
+                  sa.Column('id', sa.Integer, primary_key=True),
+                  sa.Column('name', sa.String))
+
+
+def upgrade():
+    op.create_table('genres',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(length=120), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('name')
+    )
+    for owner, link, key, _ in OWNERS:
+        op.create_table(link,
+        sa.Column(key, sa.Integer(), nullable=False),
+        sa.Column('genre_id', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint([key], [owner + '.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['genre_id'], ['genres.id'], ),
+        sa.PrimaryKeyConstraint(key, 'genre_id')
+        )
+        op.create_index('ix_{}_genre_id'.format(link), link, ['genre_id', key], unique=False)
+
+    # Existing rows hold genres as a stringified Python list, e.g. '["Jazz", "Folk"]'.
+    conn = op.get_bind()
+    genre_ids = {}
+    for owner, link, key, _ in OWNERS:
+        rows = conn.execute(sa.text('SELECT id, genres FROM {}'.format(owner))).fetchall()
+        links = []
+        for owner_id, value in rows:
+            try:
+                names = ast.literal_eval(value) if value else []
+            except (ValueError, SyntaxError):
+                names = []
+            for name in dict.fromkeys(n for n in names if n):
+                if name not in genre_ids:
+                    genre_ids[name] = conn.execute(
+                        genres.insert().values(name=name)).inserted_primary_key[0]
+                links.append({key: owner_id, 'genre_id': genre_ids[name]})
+        if links:
+            op.bulk_insert(sa.table(link, sa.column(key, sa.Integer),
+                                    sa.column('genre_id', sa.Integer)), links)
+        with op.batch_alter_table(owner) as batch_op:
+            batch_op.drop_column('genres')
+
+
+def downgrade():
+    conn = op.get_bind()
+    for owner, link, key, length in OWNERS:
+        with op.batch_alter_table(owner) as batch_op:
+            batch_op.add_column(sa.Column('genres', sa.String(length=length), nullable=True))
+        rows = conn.execute(sa.text(
+            'SELECT l.{key}, g.name FROM {link} l JOIN genres g ON g.id = l.genre_id '
+            'ORDER BY l.{key}, g.name'.format(key=key, link=link))).fetchall()
+        names = {}
+        for owner_id, name in rows:
+            names.setdefault(owner_id, []).append(name)
+        for owner_id, owner_names in names.items():
+            conn.execute(sa.text('UPDATE {} SET genres = :genres WHERE id = :id'.format(owner)),
+                         {'genres': repr(owner_names).replace("'", '"'), 'id': owner_id})
+        op.drop_index('ix_{}_genre_id'.format(link), table_name=link)
+        op.drop_table(link)
+    op.drop_table('genres')
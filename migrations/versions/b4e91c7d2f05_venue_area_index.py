@@ -0,0 +1,27 @@
+"""venue area index for the /venues listing
+
+Revision ID: b4e91c7d2f05
+Revises: 7a2d4e9b1c63
+Create Date: 2026-10-18 22:41:09.532817
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b4e91c7d2f05'
+down_revision = '7a2d4e9b1c63'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # The same expressions as app.venue_area, which /venues orders and
+    # seeks on; city and state may be NULL.
+    op.create_index('ix_venues_area', 'venues',
+                    [sa.text("coalesce(state, '')"), sa.text("coalesce(city, '')"), 'id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_venues_area', table_name='venues')
@@ -0,0 +1,43 @@
+"""composite show indexes and cascading show foreign keys
+
+Revision ID: d81a6f3b0e52
+Revises: 9c3e5d2a1f47
+Create Date: 2026-10-18 18:05:37.228140
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd81a6f3b0e52'
+down_revision = '9c3e5d2a1f47'
+branch_labels = None
+depends_on = None
+
+# The initial revision left the show foreign keys unnamed. This matches the
+# names PostgreSQL generated for them, and names the reflected constraints
+# the same way when SQLite rebuilds the table in batch mode.
+naming_convention = {'fk': '%(table_name)s_%(column_0_name)s_fkey'}
+
+
+def replace_foreign_keys(ondelete):
+    with op.batch_alter_table('shows', naming_convention=naming_convention) as batch_op:
+        for column, referred in (('venue_id', 'venues'), ('artist_id', 'artists')):
+            name = 'shows_{}_fkey'.format(column)
+            batch_op.drop_constraint(name, type_='foreignkey')
+            batch_op.create_foreign_key(name, referred, [column], ['id'], ondelete=ondelete)
+
+
+def upgrade():
+    replace_foreign_keys('CASCADE')
+    op.create_index('ix_shows_venue_id_start_time', 'shows', ['venue_id', 'start_time'], unique=False)
+    op.create_index('ix_shows_artist_id_start_time', 'shows', ['artist_id', 'start_time'], unique=False)
+    op.create_index('ix_shows_start_time_id', 'shows', ['start_time', 'id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_shows_start_time_id', table_name='shows')
+    op.drop_index('ix_shows_artist_id_start_time', table_name='shows')
+    op.drop_index('ix_shows_venue_id_start_time', table_name='shows')
+    replace_foreign_keys(None)
@@ -0,0 +1,112 @@
+import random
+import time
+from contextlib import contextmanager
+
+from flask import current_app, g, has_app_context, request, session
+from flask_sqlalchemy import SQLAlchemy, SignallingSession, get_state
+from sqlalchemy import orm
+
+SAFE_METHODS = frozenset(('GET', 'HEAD', 'OPTIONS'))
+
+
+def replica_reads(view):
+    '''Marks a view that only reads although it is POSTed (the search forms).'''
+    view.replica_reads = True
+    return view
+
+
+class RoutingSession(SignallingSession):
+    '''Session that reads from the replica picked for the request (g.db_bind).
+
+    Flushes, and everything outside a routed request (CLI commands, the
+    write handlers), go to the primary.
+    '''
+
+    def get_bind(self, mapper=None, clause=None):
+        bind = g.get('db_bind') if has_app_context() else None
+        if bind is not None and not self._flushing:
+            return get_state(self.app).db.get_engine(self.app, bind=bind)
+        return super(RoutingSession, self).get_bind(mapper, clause)
+
+
+class RoutingSQLAlchemy(SQLAlchemy):
+
+    def create_session(self, options):
+        return orm.sessionmaker(class_=RoutingSession, db=self, **options)
+
+
+class ReplicaRouting(object):
+    '''Spreads read-only requests over the SQLALCHEMY_REPLICA_URIS.
+
+    Each replica becomes a bind ("replica0", ...). GET/HEAD requests and
+    views marked with replica_reads pick one at random for their whole
+    request; anything else uses the primary. A write request pins its
+    client to the primary for REPLICA_STICKY_SECONDS, through the session
+    cookie, so users see their own changes while the replicas catch up.
+    With no replicas configured nothing changes.
+    '''
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        uris = app.config.get('SQLALCHEMY_REPLICA_URIS') or []
+        replicas = ['replica{}'.format(i) for i in range(len(uris))]
+        app.extensions['replica_routing'] = {
+            'binds': replicas,
+            'sticky_seconds': app.config.get('REPLICA_STICKY_SECONDS', 10),
+        }
+        if not replicas:
+            return
+        binds = dict(app.config.get('SQLALCHEMY_BINDS') or {})
+        binds.update(zip(replicas, uris))
+        app.config['SQLALCHEMY_BINDS'] = binds
+        app.before_request(self.route)
+        app.after_request(self._pin_writer)
+
+    @property
+    def binds(self):
+        '''The replica bind names of the current app.'''
+        return current_app.extensions['replica_routing']['binds']
+
+    def reads_primary(self):
+        '''True while the current client is pinned to the primary.'''
+        return bool(self.binds) and session.get('read_primary_until', 0) > time.time()
+
+    def use_primary(self):
+        '''Sends the rest of the request's queries to the primary.'''
+        g.db_bind = None
+
+    @contextmanager
+    def primary(self):
+        '''Runs the block's queries on the primary, for data cached as current.'''
+        bind = g.pop('db_bind', None)
+        try:
+            yield
+        finally:
+            if bind is not None:
+                g.db_bind = bind
+
+    def _read_only(self):
+        view = current_app.view_functions.get(request.endpoint)
+        return request.method in SAFE_METHODS or getattr(view, 'replica_reads', False)
+
+    def route(self):
+        '''Picks the database the current request reads from, once.
+
+        The ASGI adapter calls this before its async prefetch, so the
+        prefetch and the view read from the same database.
+        '''
+        if 'db_bind' in g or not self.binds:
+            return
+        if self._read_only() and not self.reads_primary():
+            g.db_bind = random.choice(self.binds)
+        else:
+            g.db_bind = None
+
+    def _pin_writer(self, response):
+        if not self._read_only():
+            sticky_seconds = current_app.extensions['replica_routing']['sticky_seconds']
+            session['read_primary_until'] = time.time() + sticky_seconds
+        return response
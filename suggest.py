@@ -0,0 +1,93 @@
+import threading
+import time
+import unicodedata
+from bisect import bisect_left, insort
+
+
+def normalize(text):
+    '''Case-, accent- and spacing-insensitive form of a name.'''
+    decomposed = unicodedata.normalize('NFKD', text or '')
+    return ' '.join(''.join(char for char in decomposed if not unicodedata.combining(char)).casefold().split())
+
+
+class PrefixIndex(object):
+    '''Sorted arrays of normalized names for typeahead lookups.
+
+    Every name is stored once whole and once from the start of each later
+    word, so "hop" finds "The Musical Hop". Whole-name matches are listed
+    first. A lookup is two binary searches plus a walk over the matches
+    it returns; adding or removing a name shifts the arrays in place.
+    '''
+
+    def __init__(self):
+        self.generation = None
+        self.loaded_at = 0.0
+        self._names = {}
+        self._heads = []
+        self._words = []
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _entries(entity_id, name):
+        words = normalize(name).split(' ')
+        head = (' '.join(words), entity_id)
+        return head, [(' '.join(words[i:]), entity_id) for i in range(1, len(words))]
+
+    def rebuild(self, rows, generation=None):
+        '''Replaces the contents with (id, name) rows.'''
+        names, heads, words = {}, [], []
+        for entity_id, name in rows:
+            names[entity_id] = name
+            head, tails = self._entries(entity_id, name)
+            heads.append(head)
+            words.extend(tails)
+        heads.sort()
+        words.sort()
+        with self._lock:
+            self._names, self._heads, self._words = names, heads, words
+            self.generation = generation
+            self.loaded_at = time.monotonic()
+
+    def add(self, entity_id, name):
+        '''Adds or renames an entry.'''
+        with self._lock:
+            self._discard(entity_id)
+            self._names[entity_id] = name
+            head, tails = self._entries(entity_id, name)
+            insort(self._heads, head)
+            for tail in tails:
+                insort(self._words, tail)
+
+    def remove(self, entity_id):
+        with self._lock:
+            self._discard(entity_id)
+
+    def _discard(self, entity_id):
+        name = self._names.pop(entity_id, None)
+        if name is None:
+            return
+        head, tails = self._entries(entity_id, name)
+        for entries, entry in [(self._heads, head)] + [(self._words, tail) for tail in tails]:
+            i = bisect_left(entries, entry)
+            if i < len(entries) and entries[i] == entry:
+                del entries[i]
+
+    def search(self, prefix, limit=10):
+        '''Up to limit (id, name) pairs whose name, or a word in it, starts with prefix.'''
+        prefix = normalize(prefix)
+        if not prefix:
+            return []
+        found, seen = [], set()
+        with self._lock:
+            for entries in (self._heads, self._words):
+                i = bisect_left(entries, (prefix,))
+                while len(found) < limit and i < len(entries) and entries[i][0].startswith(prefix):
+                    entity_id = entries[i][1]
+                    if entity_id not in seen:
+                        seen.add(entity_id)
+                        found.append((entity_id, self._names[entity_id]))
+                    i += 1
+        return found
+
+    def __len__(self):
+        return len(self._names)
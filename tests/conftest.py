@@ -0,0 +1,62 @@
+import os
+from datetime import datetime, timedelta
+
+# config.py sizes the connection pool for DATABASE_URL when it is imported,
+# and the tests only ever use SQLite files.
+os.environ['DATABASE_URL'] = 'sqlite://'
+os.environ.pop('DATABASE_REPLICA_URLS', None)
+
+import pytest
+
+import app as fyyur
+import config
+
+
+class TestingConfig(config.Config):
+    TESTING = True
+    SECRET_KEY = 'testing'
+    WTF_CSRF_ENABLED = False
+    JOBS_BACKEND = 'inline'
+    JINJA_BYTECODE_CACHE_DIR = ''
+
+
+def sqlite_uri(path):
+    return 'sqlite:///{}'.format(path)
+
+
+@pytest.fixture
+def make_app(tmp_path):
+    '''Builds an app on a SQLite file in tmp_path, with its tables created.
+
+    Keyword arguments override TestingConfig settings.
+    '''
+    def make(**settings):
+        settings.setdefault('SQLALCHEMY_DATABASE_URI', sqlite_uri(tmp_path / 'fyyur.db'))
+        app = fyyur.create_app(type('Config', (TestingConfig,), settings))
+        with app.app_context():
+            fyyur.db.create_all()
+        return app
+    return make
+
+
+def seed_catalog(app, venues, artists, shows):
+    '''Adds venues and artists in two genres, and shows spread evenly over
+    them, half in the past and half upcoming. The shows of a venue, or of
+    an artist, are each with a different partner.'''
+    now = datetime.now().replace(minute=0, second=0, microsecond=0)
+    with app.app_context():
+        genres = [fyyur.Genre.query.filter_by(name=name).first() or fyyur.Genre(name=name)
+                  for name in ('Jazz', 'Rock n Roll')]
+        venue_rows = [fyyur.Venue(name='Venue {}'.format(i), city='San Francisco' if i % 2 else 'New York',
+                                  state='CA' if i % 2 else 'NY', address='{} Main St'.format(i),
+                                  genres=genres) for i in range(1, venues + 1)]
+        artist_rows = [fyyur.Artist(name='Artist {}'.format(i), city='San Francisco', state='CA',
+                                    genres=genres) for i in range(1, artists + 1)]
+        fyyur.db.session.add_all(venue_rows + artist_rows)
+        fyyur.db.session.flush()
+        for i in range(shows):
+            start_time = now + timedelta(hours=2 * i - shows)
+            fyyur.db.session.add(fyyur.Show(venue_id=venue_rows[i % venues].id,
+                                            artist_id=artist_rows[(i + i // venues) % artists].id,
+                                            start_time=start_time, end_time=start_time + timedelta(hours=1)))
+        fyyur.db.session.commit()
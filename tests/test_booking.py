@@ -0,0 +1,144 @@
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import create_engine
+
+import app as fyyur
+from tests.conftest import seed_catalog
+
+START = datetime(2030, 6, 1, 20, 0)
+
+
+@pytest.fixture
+def app(make_app):
+    app = make_app()
+    seed_catalog(app, 3, 3, 0)
+    return app
+
+
+def booking(venue_id, artist_id, start_time, end_time=None):
+    record = {'venue_id': venue_id, 'artist_id': artist_id, 'start_time': start_time.isoformat()}
+    if end_time is not None:
+        record['end_time'] = end_time.isoformat()
+    return record
+
+
+def book(app, body):
+    response = app.test_client().post('/api/v1/shows', json=body)
+    return response.status_code, response.get_json()
+
+
+def show_count(app):
+    with app.app_context():
+        return fyyur.Show.query.count()
+
+
+def exclude_overlaps(app):
+    '''Makes SQLite refuse overlapping shows of a venue, as the PostgreSQL
+    exclusion constraint of 3f6a9d2c7e18 does, with an IntegrityError.'''
+    with app.app_context():
+        fyyur.db.session.execute(
+            'CREATE TRIGGER shows_venue_excl BEFORE INSERT ON shows '
+            'WHEN EXISTS (SELECT 1 FROM shows WHERE venue_id = NEW.venue_id '
+            'AND start_time < NEW.end_time AND end_time > NEW.start_time) '
+            "BEGIN SELECT RAISE(ABORT, 'shows_venue_excl'); END")
+        fyyur.db.session.commit()
+
+
+def test_overlap_reaches_back_the_longest_show(app):
+    # A show of MAX_SHOW_DURATION still covers the last minute of its day.
+    status, _ = book(app, booking(1, 1, START, START + fyyur.MAX_SHOW_DURATION))
+    assert status == 201
+    status, body = book(app, booking(1, 2, START + fyyur.MAX_SHOW_DURATION - timedelta(minutes=1)))
+    assert status == 422
+    assert body['results'] == [{'index': 0, 'error': 'the venue is already booked at that time'}]
+    status, body = book(app, booking(2, 1, START + timedelta(hours=12)))
+    assert body['results'][0]['error'] == 'the artist is already booked at that time'
+    # Back to back is fine.
+    status, body = book(app, booking(1, 2, START + fyyur.MAX_SHOW_DURATION))
+    assert status == 201 and body['booked'] == 1
+    assert show_count(app) == 2
+
+
+def test_batch_books_all_or_nothing(app):
+    status, body = book(app, {'artist_id': 1, 'shows': [
+        booking(1, 1, START),
+        booking(99, 1, START + timedelta(days=1)),
+        # Overlaps the first row.
+        booking(2, 1, START + timedelta(hours=1)),
+        booking(3, 1, START + timedelta(days=2)),
+    ]})
+    assert status == 422
+    assert body['booked'] == 0
+    assert [result['error'] for result in body['results']] == [
+        'not booked: other shows in the batch failed',
+        'unknown venue 99',
+        'the artist is already booked at that time',
+        'not booked: other shows in the batch failed',
+    ]
+    assert show_count(app) == 0
+
+
+def test_partial_batch_books_the_valid_rows(app):
+    status, body = book(app, {'partial': True, 'shows': [
+        booking(1, 1, START),
+        booking(1, 2, START + timedelta(hours=1)),
+        booking(2, 2, START + timedelta(hours=1)),
+    ]})
+    assert status == 201
+    assert body['booked'] == 2
+    assert body['results'][1] == {'index': 1, 'error': 'the venue is already booked at that time'}
+    assert all(result['id'] for result in (body['results'][0], body['results'][2]))
+    assert show_count(app) == 2
+
+
+def test_concurrent_clash_answers_409(app, monkeypatch):
+    # The conflict check misses the clash on every attempt, as when another
+    # request books the slot just after it, so both attempts of
+    # book_and_commit run into the database constraint.
+    exclude_overlaps(app)
+    book(app, booking(1, 1, START))
+    monkeypatch.setattr(fyyur, 'booking_conflicts', lambda bookings: [])
+    status, body = book(app, booking(1, 2, START + timedelta(hours=1)))
+    assert status == 409
+    assert body == {'booked': 0, 'results': [{'index': 0, 'error': 'clashes with a concurrent change; try again'}]}
+    assert show_count(app) == 1
+
+
+def test_second_overlapping_show_of_a_venue_is_refused(app):
+    client = app.test_client()
+    for artist_id in (1, 2):
+        response = client.post('/shows/create', data={
+            'venue_id': 1, 'artist_id': artist_id, 'start_time': START.isoformat(), 'duration': 90})
+        assert response.status_code == 200
+    assert b'Show could not be listed: the venue is already booked at that time.' in response.data
+    with app.app_context():
+        assert [(show.venue_id, show.artist_id) for show in fyyur.Show.query] == [(1, 1)]
+
+
+def test_retry_reports_a_show_booked_concurrently(app, monkeypatch):
+    # The first conflict check runs just before another request books the
+    # slot, so the INSERT hits the constraint. After the rollback the second
+    # attempt sees that show and reports the clash.
+    exclude_overlaps(app)
+    check = fyyur.booking_conflicts
+    calls = []
+
+    def booked_concurrently(bookings):
+        calls.append(bookings)
+        if len(calls) > 1:
+            return check(bookings)
+        other = create_engine(app.config['SQLALCHEMY_DATABASE_URI'])
+        with other.begin() as conn:
+            conn.execute(fyyur.Show.__table__.insert(), {
+                'venue_id': 1, 'artist_id': 3, 'start_time': START, 'end_time': START + timedelta(hours=2)})
+        other.dispose()
+        return []
+
+    monkeypatch.setattr(fyyur, 'booking_conflicts', booked_concurrently)
+    status, body = book(app, booking(1, 1, START + timedelta(hours=1)))
+    assert len(calls) == 2
+    assert status == 422
+    assert body['results'] == [{'index': 0, 'error': 'the venue is already booked at that time'}]
+    with app.app_context():
+        assert [show.artist_id for show in fyyur.Show.query] == [3]
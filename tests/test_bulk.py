@@ -0,0 +1,64 @@
+import json
+
+import pytest
+
+import app as fyyur
+from tests.conftest import seed_catalog
+
+
+@pytest.fixture
+def app(make_app):
+    app = make_app()
+    seed_catalog(app, 4, 4, 8)
+    with app.app_context():
+        # Imports leave out what a file lacks, so a blank city and state occur.
+        fyyur.db.session.add(fyyur.Venue(name='Nowhere Hall', genres=fyyur.Genre.query.all()))
+        fyyur.db.session.commit()
+    return app
+
+
+def cli(app, *args):
+    result = app.test_cli_runner().invoke(args=['fyyur'] + list(args))
+    assert result.exit_code == 0, result.output
+    return result.output
+
+
+def counts(app):
+    with app.app_context():
+        return fyyur.Venue.query.count(), fyyur.Artist.query.count(), fyyur.Show.query.count()
+
+
+@pytest.mark.parametrize('filename', ['export.csv', 'export.ndjson'])
+def test_export_imports_back_as_updates(app, tmp_path, filename):
+    before = counts(app)
+    for kind, updated in (('venues', 5), ('artists', 4)):
+        path = str(tmp_path / (kind + filename))
+        cli(app, 'export', kind, path)
+        assert 'Imported {}: 0 inserted, {} updated, 0 rejected'.format(kind, updated) \
+            in cli(app, 'import', kind, path)
+    path = str(tmp_path / ('shows' + filename))
+    cli(app, 'export', 'shows', path)
+    assert 'Imported shows: 0 inserted, 0 updated, 0 rejected' in cli(app, 'import', 'shows', path)
+    assert counts(app) == before
+    with app.app_context():
+        venue = fyyur.Venue.query.filter_by(name='Nowhere Hall').one()
+        assert venue.city is None and [genre.name for genre in venue.genres] == ['Jazz', 'Rock n Roll']
+
+
+def test_bad_rows_are_rejected(app, tmp_path):
+    path = tmp_path / 'bad.ndjson'
+    path.write_text('\n'.join(json.dumps(row) for row in [
+        # Taken by Venue 1.
+        {'id': 1, 'name': 'Another Hall', 'city': 'Austin', 'state': 'TX'},
+        {'name': 'New Hall', 'city': 'Austin', 'state': 'TX'},
+        {'id': 'one', 'name': 'Bad Id Hall'},
+    ]))
+    assert 'Imported venues: 1 inserted, 0 updated, 2 rejected' in cli(app, 'import', 'venues', str(path))
+
+    path = tmp_path / 'shows.ndjson'
+    path.write_text('\n'.join(json.dumps(row) for row in [
+        {'venue_id': 1, 'artist_id': 1, 'start_time': 5},
+        {'venue_id': 1, 'artist_id': 1, 'start_time': 'tomorrow'},
+        {'venue_id': 1, 'artist_id': 1, 'start_time': '2030-01-01T20:00:00'},
+    ]))
+    assert 'Imported shows: 1 inserted, 0 updated, 2 rejected' in cli(app, 'import', 'shows', str(path))
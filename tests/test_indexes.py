@@ -0,0 +1,108 @@
+import os
+
+import flask_migrate
+import pytest
+from sqlalchemy import event
+
+import app as fyyur
+from tests.conftest import TestingConfig, seed_catalog, sqlite_uri
+
+MIGRATIONS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'migrations')
+
+
+@pytest.fixture
+def app(tmp_path):
+    # The schema comes from the migrations, so these are the indexes that
+    # d81a6f3b0e52 creates rather than the ones the models declare. The
+    # database holds rows from before the genres table, so the migrations
+    # that rebuild tables run over data, as they do in production.
+    app = fyyur.create_app(type('Config', (TestingConfig,), {
+        'SQLALCHEMY_DATABASE_URI': sqlite_uri(tmp_path / 'fyyur.db'),
+        'CACHE_ENABLED': False,
+    }))
+    with app.app_context():
+        flask_migrate.upgrade(directory=MIGRATIONS, revision='4b1f0c9a7d21')
+        for statement in (
+            "INSERT INTO venues (id, name, city, state, genres) "
+            "VALUES (1, 'The Musical Hop', 'San Francisco', 'CA', '[\"Jazz\", \"Folk\"]')",
+            "INSERT INTO artists (id, name, genres) VALUES (1, 'Guns N Petals', '[\"Rock n Roll\"]')",
+            "INSERT INTO shows (venue_id, artist_id, start_time) VALUES (1, 1, '2019-05-21 21:30:00')",
+        ):
+            fyyur.db.session.execute(statement)
+        fyyur.db.session.commit()
+        flask_migrate.upgrade(directory=MIGRATIONS)
+    seed_catalog(app, 20, 20, 200)
+    return app
+
+
+def test_upgrade_keeps_existing_rows(app):
+    with app.app_context():
+        venue = fyyur.Venue.query.get(1)
+        assert venue.name == 'The Musical Hop'
+        assert [genre.name for genre in venue.genres] == ['Folk', 'Jazz']
+        assert [genre.name for genre in fyyur.Artist.query.get(1).genres] == ['Rock n Roll']
+        show = fyyur.Show.query.filter_by(venue_id=1, artist_id=1).order_by(fyyur.Show.start_time).first()
+        assert show.end_time > show.start_time
+
+
+def query_plans(app, path, table):
+    '''EXPLAIN QUERY PLAN details of every statement reading table for a GET of path.'''
+    statements = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if 'FROM {}'.format(table) in statement:
+            statements.append((statement, parameters))
+
+    with app.app_context():
+        engine = fyyur.db.engine
+    event.listen(engine, 'before_cursor_execute', capture)
+    try:
+        assert app.test_client().get(path).status_code == 200
+    finally:
+        event.remove(engine, 'before_cursor_execute', capture)
+    assert statements
+    conn = engine.raw_connection()
+    try:
+        return [' / '.join(row[3] for row in conn.execute('EXPLAIN QUERY PLAN ' + statement, parameters))
+                for statement, parameters in statements]
+    finally:
+        conn.close()
+
+
+@pytest.mark.parametrize('path, index', [
+    ('/venues/1', 'ix_shows_venue_id_start_time'),
+    ('/artists/1', 'ix_shows_artist_id_start_time'),
+    ('/shows', 'ix_shows_start_time_id'),
+    ('/api/v1/venues/1/free-slots', 'ix_shows_venue_id_start_time'),
+])
+def test_show_queries_use_the_show_indexes(app, path, index):
+    for plan in query_plans(app, path, 'shows'):
+        assert 'USING INDEX {}'.format(index) in plan, plan
+        # The index also gives the order, so no sort step is needed.
+        assert 'TEMP B-TREE' not in plan, plan
+
+
+@pytest.mark.parametrize('path, seeks', [
+    ('/venues', False),
+    ('/venues?limit=5&after=' + fyyur.encode_cursor('CA', 'San Francisco', 5), True),
+    ('/venues?limit=5&before=' + fyyur.encode_cursor('NY', 'New York', 4), True),
+])
+def test_venue_listing_pages_through_the_area_index(app, path, seeks):
+    for plan in query_plans(app, path, 'venues'):
+        assert 'USING INDEX ix_venues_area' in plan, plan
+        assert 'TEMP B-TREE' not in plan, plan
+        # A later page seeks to its cursor instead of scanning up to it.
+        assert plan.startswith('SEARCH') or not seeks, plan
+
+
+@pytest.mark.parametrize('path, table, index', [
+    ('/venues?genre=Jazz', 'venues', 'ix_venue_genres_genre_id'),
+    ('/api/v1/venues?genre=Jazz', 'venues', 'ix_venue_genres_genre_id'),
+    ('/artists?genre=Jazz', 'artists', 'ix_artist_genres_genre_id'),
+    ('/api/v1/artists?genre=Jazz', 'artists', 'ix_artist_genres_genre_id'),
+])
+def test_genre_filter_reads_the_genre_index(app, path, table, index):
+    for plan in query_plans(app, path, table):
+        assert 'USING COVERING INDEX {} (genre_id=?)'.format(index) in plan, plan
+        # The genre's rows are looked up by id, not found by a table scan.
+        assert 'SCAN {}'.format(table) not in plan, plan
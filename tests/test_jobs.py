@@ -0,0 +1,133 @@
+import sqlite3
+import time
+
+import pytest
+
+import app as fyyur
+import jobs
+
+calls = []
+
+
+@fyyur.jobs.task
+def record_call(*args):
+    calls.append(args)
+
+
+@fyyur.jobs.task
+def fail_call(*args):
+    calls.append(args)
+    raise RuntimeError('gone')
+
+
+@pytest.fixture(autouse=True)
+def clear_calls():
+    del calls[:]
+
+
+def test_inline_jobs_run_at_once(make_app):
+    app = make_app(JOBS_BACKEND='inline')
+    with app.app_context():
+        record_call.delay('venues', 1)
+        assert calls == [('venues', 1)]
+        assert fyyur.jobs.counts() == {'pending': 0, 'failed': 0}
+
+
+def test_inline_failure_is_logged_not_raised(make_app, monkeypatch):
+    app = make_app(JOBS_BACKEND='inline', JOBS_MAX_ATTEMPTS=3)
+    logged = []
+    monkeypatch.setattr(app.logger, 'error', lambda message, *args: logged.append(message % args))
+    with app.app_context():
+        fail_call.delay('artists', 2)
+    # One attempt, not JOBS_MAX_ATTEMPTS.
+    assert calls == [('artists', 2)]
+    assert logged == ["job fail_call('artists', 2) failed for good after 3 attempts: RuntimeError: gone"]
+
+
+def test_memory_workers_run_queued_jobs(make_app):
+    app = make_app(JOBS_BACKEND='memory', JOBS_WORKERS=1)
+    with app.app_context():
+        record_call.delay('shows', 3)
+    deadline = time.time() + 5
+    while not calls and time.time() < deadline:
+        time.sleep(0.01)
+    assert calls == [('shows', 3)]
+
+
+@pytest.fixture
+def sqlite_app(make_app, tmp_path):
+    # No worker threads: the tests take and run the jobs themselves.
+    return make_app(JOBS_BACKEND='sqlite', JOBS_SQLITE_PATH=str(tmp_path / 'jobs.sqlite'),
+                    JOBS_WORKERS=0, JOBS_MAX_ATTEMPTS=2, JOBS_RETRY_BACKOFF=60.0)
+
+
+def run_next(app):
+    state = app.extensions['jobs']
+    job = state['queue'].take(timeout=0)
+    if job is not None:
+        fyyur.jobs.run(state, job)
+    return job
+
+
+def stored(app):
+    conn = sqlite3.connect(app.config['JOBS_SQLITE_PATH'])
+    try:
+        return conn.execute('SELECT name, args, attempts, run_at, failed, error FROM jobs').fetchall()
+    finally:
+        conn.close()
+
+
+def test_sqlite_jobs_wait_in_the_file_until_run(sqlite_app):
+    with sqlite_app.app_context():
+        record_call.delay('venues', 1)
+        assert calls == []
+        assert fyyur.jobs.counts() == {'pending': 1, 'failed': 0}
+    assert [row[:3] for row in stored(sqlite_app)] == [('record_call', '["venues", 1]', 0)]
+    # Another process on the host sees the same queue.
+    job = jobs.SQLiteQueue(sqlite_app.config['JOBS_SQLITE_PATH']).take(timeout=0)
+    assert (job['name'], job['args']) == ('record_call', ['venues', 1])
+
+
+def test_sqlite_job_runs_once_and_is_removed(sqlite_app):
+    with sqlite_app.app_context():
+        record_call.delay('venues', 1)
+    assert run_next(sqlite_app)['attempts'] == 1
+    assert run_next(sqlite_app) is None
+    assert calls == [('venues', 1)]
+    assert stored(sqlite_app) == []
+
+
+def test_sqlite_failure_is_retried_with_backoff_then_kept(sqlite_app):
+    with sqlite_app.app_context():
+        fail_call.delay('artists', 2)
+    before = time.time()
+    run_next(sqlite_app)
+    [(_, _, attempts, run_at, failed, error)] = stored(sqlite_app)
+    assert (attempts, failed, error) == (1, 0, 'RuntimeError: gone')
+    assert before + 60 <= run_at <= time.time() + 60
+    # Not due again before the backoff has passed.
+    assert run_next(sqlite_app) is None
+    conn = sqlite3.connect(sqlite_app.config['JOBS_SQLITE_PATH'])
+    with conn:
+        conn.execute('UPDATE jobs SET run_at = 0')
+    conn.close()
+    run_next(sqlite_app)
+    assert calls == [('artists', 2)] * 2
+    # JOBS_MAX_ATTEMPTS used up: the job stays, marked failed.
+    assert [row[2::2] for row in stored(sqlite_app)] == [(2, 1)]
+    assert run_next(sqlite_app) is None
+    with sqlite_app.app_context():
+        assert fyyur.jobs.counts() == {'pending': 0, 'failed': 1}
+
+
+def test_sqlite_claim_is_taken_over_after_its_timeout(tmp_path):
+    path = str(tmp_path / 'jobs.sqlite')
+    first, second = jobs.SQLiteQueue(path, claim_timeout=60), jobs.SQLiteQueue(path, claim_timeout=0)
+    first.put('record_call', ['venues', 1])
+    assert first.take(timeout=0)['id'] == 1
+    # Claimed by the first worker.
+    assert second.take(timeout=0) is None
+    second.put('record_call', ['venues', 2])
+    assert second.take(timeout=0)['args'] == ['venues', 2]
+    # A claim of no time runs out at once, as one of a dead worker does.
+    assert second.take(timeout=0)['args'] == ['venues', 2]
@@ -0,0 +1,46 @@
+import re
+
+import pytest
+
+from tests.conftest import seed_catalog, sqlite_uri
+
+SERVER_TIMING_QUERIES = re.compile(r'db;[^,]*desc="(\d+) queries"')
+
+# (venues, artists, shows)
+SMALL = (3, 3, 6)
+LARGE = (60, 60, 600)
+
+
+@pytest.fixture
+def catalogs(make_app, tmp_path):
+    '''Two apps with the cache off, on a small and a large catalog.'''
+    apps = []
+    for name, size in (('small', SMALL), ('large', LARGE)):
+        app = make_app(SQLALCHEMY_DATABASE_URI=sqlite_uri(tmp_path / '{}.db'.format(name)),
+                       CACHE_ENABLED=False)
+        seed_catalog(app, *size)
+        apps.append(app)
+    return apps
+
+
+def queries(app, path):
+    '''Status, body and query count of a GET, as the SQL instrumentation counted it.'''
+    response = app.test_client().get(path)
+    timing = SERVER_TIMING_QUERIES.search(', '.join(response.headers.get_all('Server-Timing')))
+    return response.status_code, response.data, int(timing.group(1))
+
+
+@pytest.mark.parametrize('path', [
+    '/venues?limit=100',
+    '/artists?limit=100',
+    '/shows?limit=100',
+    '/venues/1',
+    '/artists/1',
+    '/api/v1/venues?limit=100',
+])
+def test_query_count_does_not_grow_with_the_catalog(catalogs, path):
+    small, large = (queries(app, path) for app in catalogs)
+    assert small[0] == large[0] == 200
+    # The large catalog really does list more rows on the page.
+    assert len(large[1]) > len(small[1])
+    assert small[2] == large[2]
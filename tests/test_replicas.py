@@ -0,0 +1,62 @@
+import pytest
+
+import app as fyyur
+from tests.conftest import sqlite_uri
+
+
+@pytest.fixture
+def app(make_app, tmp_path):
+    # Two SQLite files stand in for the primary and its replica; the replica
+    # only changes when sync-replicas copies the primary over it.
+    app = make_app(SQLALCHEMY_REPLICA_URIS=[sqlite_uri(tmp_path / 'replica.db')],
+                   REPLICA_STICKY_SECONDS=60)
+    with app.app_context():
+        fyyur.db.session.add_all([
+            fyyur.Venue(name='The Musical Hop', city='San Francisco', state='CA'),
+            fyyur.Venue(name='Park Square Live', city='San Francisco', state='CA'),
+        ])
+        fyyur.db.session.commit()
+    sync_replicas(app)
+    return app
+
+
+def sync_replicas(app):
+    result = app.test_cli_runner().invoke(args=['fyyur', 'sync-replicas'])
+    assert result.exit_code == 0, result.output
+
+
+def found(client, term):
+    response = client.get('/api/v1/venues/search', query_string={'search_term': term})
+    return [venue['name'] for venue in response.get_json()['data']]
+
+
+def add_venue(app, name):
+    with app.app_context():
+        fyyur.db.session.add(fyyur.Venue(name=name, city='San Francisco', state='CA'))
+        fyyur.db.session.commit()
+
+
+def test_reads_go_to_the_replica(app):
+    add_venue(app, 'The Dueling Pianos Bar')
+    client = app.test_client()
+    assert found(client, 'Dueling') == []
+    sync_replicas(app)
+    assert found(client, 'Dueling') == ['The Dueling Pianos Bar']
+
+
+def test_writer_reads_the_primary(app):
+    writer, reader = app.test_client(), app.test_client()
+    assert writer.delete('/venues/1').get_json() == {'success': True}
+    assert found(writer, 'Musical') == []
+    assert found(reader, 'Musical') == ['The Musical Hop']
+
+
+def test_cached_pages_are_rendered_from_the_primary(app):
+    reader = app.test_client()
+    assert b'The Musical Hop' in reader.get('/venues').data
+    # The delete bumps the venues list while the replica still has the venue.
+    assert app.test_client().delete('/venues/1').get_json() == {'success': True}
+    for client in (reader, app.test_client()):
+        page = client.get('/venues').data
+        assert b'Park Square Live' in page
+        assert b'The Musical Hop' not in page
@@ -0,0 +1,33 @@
+import pytest
+
+import app as fyyur
+
+
+@pytest.fixture
+def app(make_app):
+    app = make_app()
+    with app.app_context():
+        fyyur.db.session.add_all([fyyur.Venue(name=name) for name in (
+            'Café Éclair', 'ÉCOLE DE MUSIQUE', 'The Musical Hop', '100% Jazz_Club')])
+        fyyur.db.session.commit()
+    return app
+
+
+def found(app, term):
+    response = app.test_client().get('/api/v1/venues/search', query_string={'search_term': term})
+    return sorted(venue['name'] for venue in response.get_json()['data'])
+
+
+@pytest.mark.parametrize('term, names', [
+    ('musical', ['The Musical Hop']),
+    ('ÉCLAIR', ['Café Éclair']),
+    ('école', ['ÉCOLE DE MUSIQUE']),
+    ('É', ['Café Éclair', 'ÉCOLE DE MUSIQUE']),
+    ('CAFÉ', ['Café Éclair']),
+    # LIKE wildcards in the term match themselves.
+    ('100%', ['100% Jazz_Club']),
+    ('z_c', ['100% Jazz_Club']),
+    ('%', ['100% Jazz_Club']),
+])
+def test_name_search_folds_case_like_postgresql(app, term, names):
+    assert found(app, term) == names
@@ -0,0 +1,88 @@
+import pytest
+
+import app as fyyur
+import suggest
+
+
+@pytest.fixture
+def index():
+    index = suggest.PrefixIndex()
+    index.rebuild([(1, 'The Musical Hop'), (2, 'Park Square Live Music & Coffee'),
+                   (3, 'Musée de la Musique'), (4, 'Hop Scotch')])
+    return index
+
+
+def test_prefix_matches_any_word(index):
+    assert index.search('hop') == [(4, 'Hop Scotch'), (1, 'The Musical Hop')]
+    assert index.search('sq') == [(2, 'Park Square Live Music & Coffee')]
+    assert index.search('square live') == [(2, 'Park Square Live Music & Coffee')]
+    assert index.search('opera') == []
+    assert index.search('  ') == []
+
+
+def test_whole_name_matches_rank_first_and_once(index):
+    # "musique" and "musee" both start with "mus", but 3 is listed once.
+    assert index.search('mus') == [(3, 'Musée de la Musique'), (2, 'Park Square Live Music & Coffee'),
+                                   (1, 'The Musical Hop')]
+    assert index.search('mus', limit=2) == [(3, 'Musée de la Musique'), (2, 'Park Square Live Music & Coffee')]
+
+
+def test_case_accents_and_spacing_are_ignored(index):
+    assert index.search('MUSEE') == [(3, 'Musée de la Musique')]
+    assert index.search('the   musical') == [(1, 'The Musical Hop')]
+
+
+def test_add_rename_and_remove(index):
+    index.add(5, 'Hopscotch Hall')
+    # Matches of the same rank come in name order.
+    assert [entity_id for entity_id, _ in index.search('hop')] == [4, 5, 1]
+    index.add(4, 'Scotch Room')
+    assert [entity_id for entity_id, _ in index.search('hop')] == [5, 1]
+    assert index.search('scotch') == [(4, 'Scotch Room')]
+    index.remove(1)
+    index.remove(99)
+    assert index.search('hop') == [(5, 'Hopscotch Hall')]
+    assert len(index) == 4
+
+
+@pytest.fixture
+def app(make_app):
+    app = make_app(NAME_INDEX_TTL=3600)
+    with app.app_context():
+        fyyur.db.session.add(fyyur.Venue(name='The Musical Hop', city='San Francisco', state='CA'))
+        fyyur.db.session.commit()
+    return app
+
+
+def suggested(client, term):
+    return [match['name'] for match in client.get('/autocomplete/venues', query_string={'q': term}).get_json()['data']]
+
+
+def venue_form(name):
+    return {'name': name, 'city': 'San Francisco', 'state': 'CA', 'address': '1 Main St',
+            'phone': '', 'image_link': 'https://example.com/v.jpg', 'genres': ['Jazz'],
+            'website_link': '', 'facebook_link': '', 'seeking_description': ''}
+
+
+def test_index_follows_creates_renames_and_deletes(app):
+    client = app.test_client()
+    assert suggested(client, 'mus') == ['The Musical Hop']
+    client.post('/venues/create', data=venue_form('Musicland'))
+    assert suggested(client, 'mus') == ['Musicland', 'The Musical Hop']
+    client.post('/venues/1/edit', data=venue_form('Blue Note'))
+    assert suggested(client, 'mus') == ['Musicland']
+    assert suggested(client, 'blue') == ['Blue Note']
+    client.delete('/venues/1')
+    assert suggested(client, 'blue') == []
+
+
+def test_index_reloads_writes_it_did_not_see_after_the_ttl(app):
+    client = app.test_client()
+    assert suggested(client, 'park') == []
+    # As `flask fyyur import` or another worker would: no generation bump.
+    with app.app_context():
+        fyyur.db.session.add(fyyur.Venue(name='Park Square Live'))
+        fyyur.db.session.commit()
+    assert suggested(client, 'park') == []
+    app.config['NAME_INDEX_TTL'] = 0
+    assert suggested(client, 'park') == ['Park Square Live']
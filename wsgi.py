@@ -0,0 +1,16 @@
+'''Production entry point.
+
+    gunicorn -c gunicorn.conf.py wsgi:application
+
+Loads ProductionConfig unless FYYUR_CONFIG says otherwise.
+'''
+import os
+
+os.environ.setdefault('FYYUR_CONFIG', 'config.ProductionConfig')
+
+from app import create_app, db  # noqa: E402
+
+application = create_app(os.environ['FYYUR_CONFIG'])
+
+if not application.config['SECRET_KEY']:
+    raise RuntimeError('SECRET_KEY must be set in the environment for production.')